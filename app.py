@@ -1,25 +1,47 @@
 # app.py
 
+import time
+rerun_started = time.perf_counter()  # Taken before the imports, so a cold start's import time is measured
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import scipy.stats as stats
-import plotly.graph_objs as go
-import plotly.express as px
-from datetime import datetime
 import os
-import json
 import string
 import random
-import time
+import uuid
+
+import charts
+from engine import ACTIONS, ROUND_SECONDS, GameEngine
+from indicators import (game_correlation, game_history_cointegration, game_indicators, game_round_opportunities,
+                        game_round_statistics, pair_code, top_correlated_pairs)
+from metrics import REGISTRY, RerunProfiler, inc, serve_metrics, span, timed
+from storage import GameStore, ResultStore
 
 # ============================
 # ====== CONFIGURATION =======
 # ============================
 
 # Define paths for storing leaderboards and game states
-LEADERBOARD_PATH = 'leaderboards.json'
-GAME_STATE_PATH = 'game_states.json'
+LEADERBOARD_PATH = 'leaderboards.json'  # Legacy JSON leaderboards, migrated into the database
+GAME_STATE_PATH = 'game_states.json'  # Legacy JSON game states, migrated into the database
+GAME_DB_PATH = 'game_states.db'
+
+# Shared round clock: a round closes when every player has decided or ROUND_SECONDS after its first decision
+ROUND_POLL_SECONDS = 2  # How often waiting sessions check whether the round has moved on
+
+# Instrumentation: Prometheus metrics at http://127.0.0.1:METRICS_PORT/metrics (0 disables the endpoint),
+# and an opt-in profile of one rerun with PROFILE_RERUN=cprofile or PROFILE_RERUN=pyinstrument
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9464'))
+PROFILE_RERUN = os.environ.get('PROFILE_RERUN')
+PROFILE_PATH = os.environ.get('PROFILE_PATH', 'rerun.html' if PROFILE_RERUN == 'pyinstrument' else 'rerun.prof')
+
+# Correlation heatmap: rounds it covers (None for the whole history) and the largest universe drawn in full
+HEATMAP_WINDOW = None
+HEATMAP_MAX_ASSETS = 50  # Larger universes list their most correlated pairs instead
+HEATMAP_TOP_PAIRS = 20
+
+# Global leaderboard retention: results kept per Game Code and which ones are evicted first
+LEADERBOARD_RETAIN_TOP = 100
+LEADERBOARD_EVICTION = 'score'  # 'score' keeps the best results, 'recent' the latest ones
 
 # Predefined Game Codes with descriptions and creation dates
 PREDEFINED_GAME_CODES = {
@@ -41,289 +63,132 @@ PREDEFINED_GAME_CODES = {
 # ====== HELPER FUNCTIONS =====
 # ============================
 
-def load_json(path):
-    """Load JSON data from a file."""
-    try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError:
-        st.error(f"Error decoding JSON from {path}. Please check the file format.")
-        return {}
-
-def save_json(path, data):
-    """Save JSON data to a file."""
-    try:
-        with open(path, 'w') as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        st.error(f"Error saving JSON to {path}: {e}")
-
-def initialize_game_state():
+def initialize_game_state(game_engine):
     """Initialize game states for all predefined Game Codes."""
-    game_states = load_json(GAME_STATE_PATH)
-    updated = False
-
-    for game_code, details in PREDEFINED_GAME_CODES.items():
-        if game_code not in game_states:
-            # Initialize new game state for this game code
-            game_states[game_code] = {
-                'players': {},
-                'current_round': 1,
-                'num_rounds': 15,  # Increased number of rounds for added difficulty
-                'assets': ['Asset A', 'Asset B', 'Asset C', 'Asset D', 'Asset E'],
-                'asset_initial_prices': [100, 105, 110, 95, 102],
-                'asset_price_history': {asset: [price] for asset, price in zip(['Asset A', 'Asset B', 'Asset C', 'Asset D', 'Asset E'], [100, 105, 110, 95, 102])},
-                'capital_history': {},  # Populated per player
-                'market_conditions': generate_market_conditions(15),
-                'leaderboard': {}
-            }
-            updated = True
-
-    if updated:
-        save_json(GAME_STATE_PATH, game_states)
-
-    return game_states
-
-def initialize_leaderboards():
-    """Initialize leaderboards if not present."""
-    leaderboards = load_json(LEADERBOARD_PATH)
-    updated = False
-
-    for game_code in PREDEFINED_GAME_CODES.keys():
-        if game_code not in leaderboards:
-            leaderboards[game_code] = []
-            updated = True
-
-    if updated:
-        save_json(LEADERBOARD_PATH, leaderboards)
-
-    return leaderboards
-
-def initialize_player(game_states, player_name, game_code):
+    # Import games from the legacy JSON file on first run
+    game_engine.store.migrate_from_json(GAME_STATE_PATH)
+
+    for game_code in PREDEFINED_GAME_CODES:
+        game_engine.create_game(game_code)
+
+def initialize_leaderboards(result_store):
+    """Import the legacy JSON leaderboards into the global leaderboard store."""
+    result_store.migrate_from_json(LEADERBOARD_PATH)
+
+def lock_metrics(game_engine):
+    """Per-game lock wait and write retry samples for the metrics endpoint."""
+    for game_code, stats in game_engine.lock_stats().items():
+        labels = {'game': game_code}
+        yield 'lock_acquisitions_total', labels, stats['acquisitions']
+        yield 'lock_wait_seconds_total', labels, stats['wait_total']
+        yield 'lock_wait_max_seconds', labels, stats['wait_max']
+        yield 'write_conflicts_total', labels, stats['conflicts']
+
+def start_metrics_endpoint():
+    """Serve the metrics; None if disabled or the port is taken."""
+    if not METRICS_PORT:
+        return None
+    try:
+        return serve_metrics(METRICS_PORT)
+    except OSError:
+        return None  # e.g. another server process on this machine already serves it
+
+@st.cache_resource(show_spinner="🚀 Starting up...")
+def bootstrap():
+    """Open the stores, initialize games and leaderboards and serve metrics, once per server process.
+
+    Every step is idempotent, so a process that is restarted on an existing
+    database only opens it.
+    """
+    with span('bootstrap'):
+        game_engine = GameEngine(GameStore(GAME_DB_PATH), round_seconds=ROUND_SECONDS)
+        initialize_game_state(game_engine)
+        result_store = ResultStore(GAME_DB_PATH, retain_top=LEADERBOARD_RETAIN_TOP, eviction=LEADERBOARD_EVICTION)
+        initialize_leaderboards(result_store)
+        REGISTRY.add_collector(lambda: lock_metrics(game_engine))
+        start_metrics_endpoint()
+    return game_engine, result_store
+
+@st.cache_resource(show_spinner=False)
+def get_rerun_profiler():
+    """The process's one-shot rerun profiler, or None unless PROFILE_RERUN is set."""
+    return RerunProfiler(PROFILE_RERUN, PROFILE_PATH) if PROFILE_RERUN else None
+
+def show_decision_feedback():
+    """Show the feedback left by the previous run's decision as a toast and record its round trip."""
+    feedback = st.session_state.pop('decision_feedback', None)
+    if feedback is None:
+        return
+    message, icon, clicked_at = feedback
+    st.toast(message, icon=icon)
+    REGISTRY.observe('decision_round_trip', time.perf_counter() - clicked_at)
+
+def initialize_player(game_engine, player_name, game_code):
     """Add a player to a specific game session."""
-    game = game_states[game_code]
-    if player_name not in game['players']:
-        game['players'][player_name] = {
-            'capital': 200000,
-            'score': 0,
-            'penalties': 0,
-            'decisions': [],
-            'capital_history': [200000]
-        }
-        save_json(GAME_STATE_PATH, game_states)
+    if game_engine.join(game_code, player_name):
         st.sidebar.success(f"✅ Joined game '{game_code}' as '{player_name}'.")
     else:
         st.sidebar.info(f"ℹ️ You are already in game '{game_code}'.")
 
-def generate_market_conditions(num_rounds):
-    """Generate market conditions for the game rounds."""
-    conditions = []
-    for _ in range(num_rounds):
-        condition = np.random.choice(
-            ['Stable Market', 'Volatile Market', 'Bull Market', 'Bear Market'], 
-            p=[0.3, 0.4, 0.2, 0.1]
-        )
-        conditions.append(condition)
-    return conditions
-
-def simulate_market(asset_prices, market_condition):
-    """Simulate market movements based on the current market condition."""
-    new_prices = []
-    for price in asset_prices:
-        if market_condition == 'Bull Market':
-            change_percent = np.random.uniform(0.05, 0.15)
-        elif market_condition == 'Bear Market':
-            change_percent = np.random.uniform(-0.15, -0.05)
-        elif market_condition == 'Volatile Market':
-            change_percent = np.random.uniform(-0.2, 0.2)
-        else:  # Stable Market
-            change_percent = np.random.uniform(-0.03, 0.03)
-        new_price = price * (1 + change_percent)
-        new_prices.append(round(new_price, 2))
-    return new_prices
-
-def calculate_statistics(asset_prices, asset_index_1, asset_index_2):
-    """Calculate advanced statistical indicators for asset pairs."""
-    # Simulate 30-day historical prices with realistic correlations
-    np.random.seed()  # Ensure randomness per call
-    base_price_1 = asset_prices[asset_index_1]
-    base_price_2 = asset_prices[asset_index_2]
-    
-    # Generate correlated price series
-    correlation = np.random.uniform(0.5, 0.95)  # High correlation for arbitrage opportunities
-    mean = [base_price_1, base_price_2]
-    std_dev = [5, 5]
-    cov = [[std_dev[0]**2, correlation * std_dev[0] * std_dev[1]],
-           [correlation * std_dev[0] * std_dev[1], std_dev[1]**2]]
-    price_series = np.random.multivariate_normal(mean, cov, 30)
-    price_series_1 = price_series[:,0]
-    price_series_2 = price_series[:,1]
-    
-    # Moving Averages
-    ma_short_1 = np.mean(price_series_1[-5:])
-    ma_long_1 = np.mean(price_series_1[-20:])
-    ma_short_2 = np.mean(price_series_2[-5:])
-    ma_long_2 = np.mean(price_series_2[-20:])
-    
-    # Correlation
-    corr_coef, _ = stats.pearsonr(price_series_1, price_series_2)
-    
-    # Z-Score
-    spread = price_series_1 - price_series_2
-    mean_spread = np.mean(spread)
-    std_spread = np.std(spread)
-    z_score = (spread[-1] - mean_spread) / std_spread if std_spread != 0 else 0
-    
-    # Bollinger Bands
-    bollinger_upper = ma_long_1 + (2 * std_spread)
-    bollinger_lower = ma_long_1 - (2 * std_spread)
-    
-    # RSI
-    delta = np.diff(price_series_1)
-    up = np.where(delta > 0, delta, 0)
-    down = np.where(delta < 0, -delta, 0)
-    avg_gain = np.mean(up[-14:]) if len(up) >=14 else np.mean(up)
-    avg_loss = np.mean(down[-14:]) if len(down) >=14 else np.mean(down)
-    rs = avg_gain / avg_loss if avg_loss != 0 else 0
-    rsi = 100 - (100 / (1 + rs))
-    
-    # MACD
-    ema_short = pd.Series(price_series_1).ewm(span=12, adjust=False).mean().iloc[-1]
-    ema_long = pd.Series(price_series_1).ewm(span=26, adjust=False).mean().iloc[-1]
-    macd = ema_short - ema_long
-    signal = pd.Series(price_series_1).ewm(span=9, adjust=False).mean().iloc[-1]
-    macd_hist = macd - signal
-    
-    stats_dict = {
-        'ma_short_1': round(ma_short_1, 2),
-        'ma_long_1': round(ma_long_1, 2),
-        'ma_short_2': round(ma_short_2, 2),
-        'ma_long_2': round(ma_long_2, 2),
-        'correlation': round(corr_coef, 2),
-        'z_score': round(z_score, 2),
-        'bollinger_upper': round(bollinger_upper, 2),
-        'bollinger_lower': round(bollinger_lower, 2),
-        'rsi': round(rsi, 2),
-        'macd': round(macd, 2),
-        'signal': round(signal, 2),
-        'macd_hist': round(macd_hist, 2)
-    }
-    return stats_dict, price_series_1, price_series_2
-
-def update_leaderboard(game_code):
-    """Update the leaderboard for a specific game code."""
-    game_states = load_json(GAME_STATE_PATH)
-    game = game_states[game_code]
-    players = game['players']
-    leaderboard = []
-    for player, data in players.items():
-        final_score = data['score'] - data['penalties']
-        leaderboard.append({
-            'Player': player,
-            'Score': final_score,
-            'Capital': round(data['capital'], 2),
-            'Penalties': data['penalties'],
-            'Decisions Made': len(data['decisions'])
-        })
-    leaderboard_df = pd.DataFrame(leaderboard)
-    leaderboard_df = leaderboard_df.sort_values(by=['Score', 'Capital'], ascending=[False, False])
-    game_states[game_code]['leaderboard'] = leaderboard_df.to_dict('records')
-    save_json(GAME_STATE_PATH, game_states)
-    return leaderboard_df
-
-def plot_capital_history(player_data):
-    """Plot the capital history of a player."""
-    rounds = list(range(1, len(player_data['capital_history']) + 1))
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=rounds, y=player_data['capital_history'],
-                             mode='lines+markers',
-                             name='Capital'))
-    fig.update_layout(title='📈 Capital Over Time',
-                      xaxis_title='Round',
-                      yaxis_title='Capital ($)',
-                      template='plotly_dark')
-    return fig
-
-def plot_asset_prices(price_series_1, price_series_2, stats_dict, asset_pair):
-    """Plot the asset prices along with statistical indicators."""
-    df = pd.DataFrame({
-        'Asset 1': price_series_1,
-        'Asset 2': price_series_2
-    })
-    df.index = pd.RangeIndex(start=1, stop=len(df)+1, step=1)
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['Asset 1'], mode='lines', name=asset_pair.split(' & ')[0]))
-    fig.add_trace(go.Scatter(x=df.index, y=df['Asset 2'], mode='lines', name=asset_pair.split(' & ')[1]))
-    
-    # Add Moving Averages
-    fig.add_trace(go.Scatter(x=df.index, y=[stats_dict['ma_short_1']]*len(df), mode='lines', name='MA Short 1', line=dict(dash='dash')))
-    fig.add_trace(go.Scatter(x=df.index, y=[stats_dict['ma_long_1']]*len(df), mode='lines', name='MA Long 1', line=dict(dash='dash')))
-    
-    # Add Bollinger Bands
-    fig.add_trace(go.Scatter(x=df.index, y=[stats_dict['bollinger_upper']]*len(df), mode='lines', name='Bollinger Upper', line=dict(color='rgba(255,0,0,0.5)', dash='dot')))
-    fig.add_trace(go.Scatter(x=df.index, y=[stats_dict['bollinger_lower']]*len(df), mode='lines', name='Bollinger Lower', line=dict(color='rgba(255,0,0,0.5)', dash='dot')))
-    
-    fig.update_layout(title=f'📉 Asset Prices and Indicators for {asset_pair}',
-                      xaxis_title='Time',
-                      yaxis_title='Price ($)',
-                      template='plotly_dark',
-                      legend=dict(x=0.01, y=0.99))
-    return fig
-
-def plot_heatmap(correlation_matrix, asset_names):
-    """Plot a heatmap of asset correlations."""
-    fig = px.imshow(correlation_matrix,
-                    x=asset_names,
-                    y=asset_names,
-                    color_continuous_scale='Viridis',
-                    title='🔍 Asset Correlation Heatmap')
-    fig.update_layout(template='plotly_dark')
-    return fig
-
-def plot_z_score_distribution(z_scores):
-    """Plot the distribution of Z-Scores."""
-    fig = px.histogram(z_scores, nbins=20, title='📊 Z-Score Distribution', labels={'value':'Z-Score'}, template='plotly_dark')
-    fig.update_layout(xaxis_title='Z-Score', yaxis_title='Frequency')
-    return fig
-
-def plot_decision_impact(player_data):
-    """Plot the impact of player's decisions on their capital."""
-    rounds = list(range(1, len(player_data['decisions']) + 1))
-    rewards = [decision['reward'] for decision in player_data['decisions']]
-    penalties = [decision['penalty'] for decision in player_data['decisions']]
-    actions = [decision['action'] for decision in player_data['decisions']]
-    
-    df = pd.DataFrame({
-        'Round': rounds,
-        'Reward': rewards,
-        'Penalty': penalties,
-        'Action': actions
-    })
-    
-    fig = go.Figure()
-    fig.add_trace(go.Bar(x=df['Round'], y=df['Reward'], name='Rewards', marker_color='green'))
-    fig.add_trace(go.Bar(x=df['Round'], y=df['Penalty'], name='Penalties', marker_color='red'))
-    fig.update_layout(title='📉 Decision Impact on Capital',
-                      xaxis_title='Round',
-                      yaxis_title='Amount ($)',
-                      barmode='relative',
-                      template='plotly_dark')
-    return fig
+# Figures are memoized on their inputs and shared by all sessions, so they must not be modified;
+# the spans time actual builds only
+FIGURE_CACHE = st.cache_resource(max_entries=256, show_spinner=False)
+plot_capital_history = FIGURE_CACHE(timed('plot_capital_history')(charts.plot_capital_history))
+plot_asset_prices = FIGURE_CACHE(timed('plot_asset_prices')(charts.plot_asset_prices))
+plot_heatmap = FIGURE_CACHE(timed('plot_heatmap')(charts.plot_heatmap))
+plot_z_score_distribution = FIGURE_CACHE(timed('plot_z_score_distribution')(charts.plot_z_score_distribution))
+plot_decision_impact = FIGURE_CACHE(timed('plot_decision_impact')(charts.plot_decision_impact))
+
+@st.fragment(run_every=ROUND_POLL_SECONDS)
+def watch_round(game_code, current_round):
+    """Rerun the page once the shared round clock has moved the game past `current_round`.
+
+    Also restarts the clock of a round with queued decisions but no timer in
+    this process, e.g. after a server restart.
+    """
+    if game_engine.store.round_info(game_code)[0] != current_round:
+        st.rerun()
+    game_engine.resume_clock(game_code)
+
+def show_heatmap(game_code, game):
+    """Display the correlation heatmap of all assets from the game's price history."""
+    with span('correlation'):
+        correlation_matrix = game_correlation(game_code, game, window=HEATMAP_WINDOW)
+    assets = game['assets']
+    if len(assets) <= HEATMAP_MAX_ASSETS:
+        st.plotly_chart(plot_heatmap(correlation_matrix, assets), width='stretch')
+    else:
+        top_pairs = top_correlated_pairs(correlation_matrix, HEATMAP_TOP_PAIRS)
+        st.dataframe({
+            'Asset 1': [assets[i] for i, _, _ in top_pairs],
+            'Asset 2': [assets[j] for _, j, _ in top_pairs],
+            'Correlation': [round(corr, 3) for _, _, corr in top_pairs]
+        }, hide_index=True, width='stretch')
+
+def show_decision_impact(player):
+    """Display the impact of a player's decisions on their capital."""
+    decisions = player['decisions']
+    st.plotly_chart(plot_decision_impact(decisions['reward'], decisions['penalty']), width='stretch')
 
 # ============================
 # ====== STREAMLIT APP ========
 # ============================
 
-# Initialize game states and leaderboards
-game_states = initialize_game_state()
-leaderboards = initialize_leaderboards()
+# Imports are cached by Python, so only a cold start pays for them; profile this run if requested
+REGISTRY.observe('imports', time.perf_counter() - rerun_started)
+profiler = get_rerun_profiler()
+if profiler is not None:
+    profiler.start()
+session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex[:8])
+inc('reruns_total', session=session_id)
 
 st.set_page_config(page_title="Statistical Arbitrage Showdown 📊⚖️", layout="wide", initial_sidebar_state="expanded")
 st.title("📊⚖️ **Statistical Arbitrage Showdown**")
 
+# Initialize game states and leaderboards after the page has started to render (cached, shared by all sessions)
+game_engine, result_store = bootstrap()
+show_decision_feedback()
+
 # Sidebar for Player Registration
 st.sidebar.header("🔐 Player Registration")
 player_name = st.sidebar.text_input("👤 Enter Your Name", max_chars=20)
@@ -338,17 +203,27 @@ if join_button:
     if player_name.strip() == "":
         st.sidebar.error("❗ Please enter a valid name.")
     else:
-        initialize_player(game_states, player_name, game_code)
-
-# Refresh game states after potential updates
-game_states = load_json(GAME_STATE_PATH)
+        initialize_player(game_engine, player_name, game_code)
+
+with st.sidebar.expander("⏱️ Server Metrics"):
+    latency = REGISTRY.span_stats('decision_round_trip').summary()
+    st.write(f"**Decision round trip:** p50 {latency['p50'] * 1000:.0f} ms | "
+             f"p95 {latency['p95'] * 1000:.0f} ms | max {latency['max'] * 1000:.0f} ms "
+             f"({latency['count']} decisions)")
+    reruns = REGISTRY.span_stats('rerun').summary()
+    st.write(f"**Page run:** p50 {reruns['p50'] * 1000:.0f} ms | p95 {reruns['p95'] * 1000:.0f} ms "
+             f"({reruns['count']} runs)")
+
+# Load only the selected game after potential updates (served from memory unless it changed).
+# The page only reads it, so it gets the shared snapshot rather than a copy.
+with span('load_game'):
+    game = game_engine.store.load_game(game_code, copy=False)
 
 # Proceed only if player has joined a game
 if player_name and game_code:
-    if player_name not in game_states[game_code]['players']:
+    if player_name not in game['players']:
         st.warning(f"You need to join the game '{game_code}' by clicking 'Join Game'.")
     else:
-        game = game_states[game_code]
         player = game['players'][player_name]
         
         # Display Game Information
@@ -356,25 +231,33 @@ if player_name and game_code:
         st.write(f"**Round:** {game['current_round']} / {game['num_rounds']}")
         st.write(f"**Capital:** ${player['capital']:.2f}")
         st.write(f"**Score:** {player['score']} | **Penalties:** {player['penalties']}")
-        
-        # Display Correlation Heatmap for All Assets
-        st.markdown("### 🔍 **Asset Correlation Heatmap**")
-        asset_names = game['assets']
-        # Generate a correlation matrix for visualization
-        # Using the 'asset_price_history' to compute correlations
-        asset_price_history = game['asset_price_history']
-        correlation_matrix = pd.DataFrame(asset_price_history).corr().values
-        fig_heatmap = plot_heatmap(correlation_matrix, asset_names)
-        st.plotly_chart(fig_heatmap, use_container_width=True)
+        with span('leaderboard'):
+            leaderboard = game_engine.leaderboard(game_code)
+        st.write(f"**Rank:** {leaderboard.rank(player_name)} / {len(leaderboard)}")
         
         # If game is ongoing
         if game['current_round'] <= game['num_rounds']:
             current_round = game['current_round']
             current_market = game['market_conditions'][current_round -1]
             st.markdown(f"### 📈 **Current Market Condition:** {current_market}")
+            watch_round(game_code, current_round)
+            
+            # Outcome of the player's decision in the round that just closed
+            last_decision = player['decisions'].record(-1) if len(player['decisions']) else None
+            if last_decision is not None and last_decision['round'] == current_round - 1:
+                if last_decision['successful']:
+                    st.success(f"🎉 **Round {last_decision['round']}: Successful Arbitrage!** You earned **${last_decision['reward']}**.")
+                elif last_decision['penalty']:
+                    st.error(f"⚠️ **Round {last_decision['round']}: Failed Arbitrage.** You lost **${last_decision['penalty']}**.")
+                else:
+                    st.info(f"🟡 **Round {last_decision['round']}:** You chose to hold. No action taken.")
             
             # Asset Selection
             st.subheader("📊 **Select Asset Pair for Arbitrage**")
+            with st.expander("🏅 Best Opportunities (ranked by |Z-Score|)"):
+                with span('opportunities'):
+                    opportunities = game_round_opportunities(game_code, game)
+                st.dataframe(opportunities, hide_index=True, width='stretch')
             asset_options = game['assets']
             asset_pair = st.selectbox("🔀 Choose a pair of assets to trade:", 
                                       [f"{asset_options[i]} & {asset_options[j]}" 
@@ -391,8 +274,9 @@ if player_name and game_code:
             asset_prices_display = ", ".join([f"{asset}: ${price:.2f}" for asset, price in zip(game['assets'], game['asset_initial_prices'])])
             st.write(asset_prices_display)
             
-            # Calculate and Display Advanced Statistics
-            stats_dict, price_series_1, price_series_2 = calculate_statistics(game['asset_initial_prices'], asset_index_1, asset_index_2)
+            # Display Advanced Statistics, computed once per round for all pairs
+            with span('round_statistics'):
+                stats_dict, price_series_1, price_series_2 = game_round_statistics(game_code, game)[(asset_index_1, asset_index_2)]
             st.markdown("### 📉 **Statistical Indicators:**")
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -408,90 +292,77 @@ if player_name and game_code:
                 st.metric("🔺 RSI", stats_dict['rsi'])
                 st.metric("📉 MACD Hist", stats_dict['macd_hist'])
             
-            # Plot Asset Prices with Indicators
-            st.markdown("### 📈 **Asset Price Movements with Indicators:**")
-            fig_assets = plot_asset_prices(price_series_1, price_series_2, stats_dict, asset_pair)
-            st.plotly_chart(fig_assets, use_container_width=True)
+            # Indicators maintained incrementally on the game's own price history
+            with st.expander("📡 Live Indicators from Game Price History"):
+                with span('live_indicators'):
+                    live_indicators = game_indicators(game_code, game)
+                live_asset = live_indicators.asset_snapshot(asset_index_1)
+                live_pair = live_indicators.pair_snapshot(asset_index_1, asset_index_2)
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("📊 Spread Z-Score", round(live_pair['z_score'], 2))
+                col2.metric("📈 MA Short (5)", round(live_asset['ma_short'], 2))
+                col3.metric("📉 MA Long (20)", round(live_asset['ma_long'], 2))
+                col4.metric("🔺 RSI", round(live_asset['rsi'], 2))
+                
+                # Hedge ratio and cointegration of the pair on the real price history
+                with span('history_cointegration'):
+                    history_coint = game_history_cointegration(game_code, game)
+                pair_row = pair_code(len(asset_options), asset_index_1, asset_index_2)
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("⚖️ Hedge Ratio", round(float(history_coint['hedge_ratio'][pair_row]), 2))
+                col2.metric("🧪 Coint p-value", round(float(history_coint['coint_p_value'][pair_row]), 3))
+                col3.metric("⏳ Half-Life", round(float(history_coint['half_life'][pair_row]), 1))
+                col4.metric("📊 Hedged Z-Score", round(float(history_coint['spread_z_score'][pair_row]), 2))
+                col1, col2, _, _ = st.columns(4)
+                col1.metric("🔁 Rolling Hedge Ratio (20)",
+                            round(float(history_coint['rolling_hedge_ratio'][pair_row]), 2))
+                col2.metric("🛰️ Kalman Hedge Ratio", round(float(history_coint['kalman_hedge_ratio'][pair_row]), 2))
             
-            # Plot Z-Score Distribution
-            st.markdown("### 📊 **Z-Score Distribution:**")
-            z_scores = [decision['z_score'] for decision in player['decisions']] if player['decisions'] else []
-            if z_scores:
-                fig_z = plot_z_score_distribution(z_scores)
-                st.plotly_chart(fig_z, use_container_width=True)
-            else:
-                st.write("No Z-Score data available yet.")
+            # Charts: only the selected tab is built and sent to the browser
+            tab_assets, tab_heatmap, tab_z, tab_decisions = st.tabs(
+                ["📈 Asset Prices", "🔍 Correlation Heatmap", "📊 Z-Score Distribution", "📉 Decision Impact"],
+                key='chart_tab', on_change='rerun'
+            )
+            if tab_assets.open:
+                with tab_assets:
+                    fig_assets = plot_asset_prices(price_series_1, price_series_2, stats_dict, asset_pair)
+                    st.plotly_chart(fig_assets, width='stretch')
+            if tab_heatmap.open:
+                with tab_heatmap:
+                    show_heatmap(game_code, game)
+            if tab_z.open:
+                with tab_z:
+                    z_scores = player['decisions']['z_score']
+                    if len(z_scores):
+                        st.plotly_chart(plot_z_score_distribution(z_scores), width='stretch')
+                    else:
+                        st.write("No Z-Score data available yet.")
+            if tab_decisions.open:
+                with tab_decisions:
+                    show_decision_impact(player)
             
-            # Decision Making
+            # Decision Making: decisions are settled together when the round closes
             st.subheader("⚖️ **Your Decision**")
-            action = st.radio("🕹️ Choose your action:", ("🔼 Go Long", "🔽 Go Short", "⏸️ Hold"))
-            risk_level = st.slider("🎯 Risk Level:", 1, 10, 5)
-            
-            if st.button("✅ Execute Decision"):
-                # Decision Logic
-                reward = 0
-                penalty = 0
-                successful = False
-                if action != "⏸️ Hold":
-                    if (action == "🔼 Go Long" and stats_dict['z_score'] > 1) or (action == "🔽 Go Short" and stats_dict['z_score'] < -1):
-                        # Successful Arbitrage
-                        reward = risk_level * 1500  # Increased reward for higher difficulty
-                        player['capital'] += reward
-                        player['score'] += int(reward / 150)  # Adjusted scoring
-                        successful = True
-                        st.success(f"🎉 **Successful Arbitrage!** You earned **${reward}**.")
-                    else:
-                        # Failed Arbitrage
-                        penalty = risk_level * 700  # Increased penalty for higher difficulty
-                        player['capital'] -= penalty
-                        player['penalties'] += penalty
-                        st.error(f"⚠️ **Failed Arbitrage.** You lost **${penalty}**.")
-                else:
-                    st.info("🟡 You chose to hold. No action taken.")
-                
-                # Update Capital History
-                player['capital_history'].append(player['capital'])
-                
-                # Record Decision
-                player['decisions'].append({
-                    'round': current_round,
-                    'asset_pair': asset_pair,
-                    'action': action,
-                    'risk_level': risk_level,
-                    'reward': reward,
-                    'penalty': penalty,
-                    'successful': successful,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'z_score': stats_dict['z_score']
-                })
-                
-                # Update Asset Price History
-                for i, asset in enumerate(game['assets']):
-                    game['asset_price_history'][asset].append(game['asset_initial_prices'][i])
-                
-                # Simulate Market for Next Round
-                new_prices = simulate_market(game['asset_initial_prices'], current_market)
-                game['asset_initial_prices'] = new_prices
-                
-                # Update Leaderboard
-                leaderboard_df = update_leaderboard(game_code)
-                
-                # Move to Next Round
-                game['current_round'] +=1
-                
-                # Save updated game state
-                game_states[game_code] = game
-                save_json(GAME_STATE_PATH, game_states)
-                
-                # Optional: Add a brief pause before rerunning
-                time.sleep(1)
+            pending = game_engine.pending(game_code)
+            if player_name in pending:
+                st.info(f"⏳ Decision locked in for round {current_round}. Waiting for the other players "
+                        f"({len(pending)} / {len(leaderboard)} decided, at most {ROUND_SECONDS}s).")
+            else:
+                action = st.radio("🕹️ Choose your action:", ACTIONS)
+                risk_level = st.slider("🎯 Risk Level:", 1, 10, 5)
                 
-                st.rerun()  # Fixed from st.experimental_rerun
-            
-            # Plot Decision Impact
-            st.markdown("### 📉 **Decision Impact on Capital:**")
-            fig_decision = plot_decision_impact(player)
-            st.plotly_chart(fig_decision, use_container_width=True)
+                if st.button("✅ Execute Decision"):
+                    # Queue the decision; the round clock settles the whole round at once
+                    clicked_at = time.perf_counter()
+                    inc('session_decisions_total', session=session_id)
+                    if game_engine.submit(game_code, player_name, (asset_index_1, asset_index_2), action, risk_level) is None:
+                        feedback = ("This round has already closed.", "🏁")
+                    else:
+                        feedback = (f"Decision submitted for round {current_round}.", "📨")
+                    
+                    # Shown by the next run, which starts right away
+                    st.session_state.decision_feedback = (*feedback, clicked_at)
+                    st.rerun()
         
         else:
             # Game Over Section
@@ -500,35 +371,42 @@ if player_name and game_code:
             st.write(f"**Final Score:** {final_score}")
             st.write(f"**Final Capital:** ${player['capital']:.2f}")
             
-            # Plot Capital History
-            st.markdown("### 📈 **Your Capital Over Time:**")
-            fig_capital = plot_capital_history(player)
-            st.plotly_chart(fig_capital, use_container_width=True)
-            
-            # Plot Decision Impact
-            st.markdown("### 📉 **Your Decision Impact:**")
-            fig_decision = plot_decision_impact(player)
-            st.plotly_chart(fig_decision, use_container_width=True)
+            # Charts: only the selected tab is built and sent to the browser
+            tab_capital, tab_decisions, tab_heatmap = st.tabs(
+                ["📈 Your Capital Over Time", "📉 Your Decision Impact", "🔍 Correlation Heatmap"],
+                key='final_chart_tab', on_change='rerun'
+            )
+            if tab_capital.open:
+                with tab_capital:
+                    st.plotly_chart(plot_capital_history(player['capital_history']), width='stretch')
+            if tab_decisions.open:
+                with tab_decisions:
+                    show_decision_impact(player)
+            if tab_heatmap.open:
+                with tab_heatmap:
+                    show_heatmap(game_code, game)
             
             # Display Leaderboard
             st.markdown("### 🏆 **Leaderboard:**")
-            leaderboard_df = pd.DataFrame(game['leaderboard'])
-            if not leaderboard_df.empty:
-                st.table(leaderboard_df)
+            with span('leaderboard'):
+                leaderboard_records = game_engine.leaderboard(game_code).records()
+            if leaderboard_records:
+                st.table(leaderboard_records)
             else:
                 st.write("No leaderboard data available.")
             
-            # Update Global Leaderboard
-            leaderboards = load_json(LEADERBOARD_PATH)
-            if game_code not in leaderboards:
-                leaderboards[game_code] = []
-            leaderboards[game_code].append({
-                'Player': player_name,
-                'Final Score': final_score,
-                'Final Capital': round(player['capital'], 2),
-                'Date': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')
-            })
-            save_json(LEADERBOARD_PATH, leaderboards)
+            # Update Global Leaderboard once per session; recording is idempotent per player and game
+            result = (game_code, player_name, final_score, round(player['capital'], 2))
+            if st.session_state.get('recorded_result') != result:
+                result_store.record(*result)
+                st.session_state.recorded_result = result
+            
+            st.markdown(f"### 🌍 **All-Time Best in {game_code}:**")
+            best_results = result_store.top(game_code, k=10)
+            if best_results:
+                columns = {'player_name': 'Player', 'final_score': 'Final Score',
+                           'final_capital': 'Final Capital', 'finished_at': 'Date (UTC)'}
+                st.table([{label: result[key] for key, label in columns.items()} for result in best_results])
             
             st.markdown("---")
             st.markdown("**Statistical Arbitrage Showdown 📊⚖️** - Developed with ❤️ by [Shashank](https://github.com/shashoriginal). Empowering the next generation of Quantitative Finance professionals.")
@@ -542,3 +420,12 @@ else:
 
 st.markdown("---")
 st.markdown("**Statistical Arbitrage Showdown 📊⚖️** - Developed with ❤️ by [Shashank](https://github.com/shashoriginal). Empowering the next generation of Quantitative Finance professionals.")
+
+# Completed runs only: runs cut short by st.rerun or st.stop are not timed.
+# The process's first completed run, imports and bootstrap included, is its time to first paint.
+rerun_seconds = time.perf_counter() - rerun_started
+REGISTRY.observe('rerun', rerun_seconds)
+if not REGISTRY.span_stats('first_paint').count:
+    REGISTRY.observe('first_paint', rerun_seconds)
+if profiler is not None:
+    profiler.stop()
@@ -0,0 +1,345 @@
+# benchmark.py
+
+import argparse
+from datetime import datetime, timezone
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import charts
+from engine import ACTIONS, GameEngine, new_game, new_player, settle_decisions
+from indicators import (all_pair_statistics, asset_pairs, calculate_statistics, game_correlation,
+                        simulate_round_history)
+from leaderboard import Leaderboard
+from market import step_markets
+from metrics import LatencyStats
+from price_history import PriceHistory
+from storage import GameStore
+
+# ============================
+# ====== CONFIGURATION =======
+# ============================
+
+# Parameter grids of each benchmark; --quick keeps the first value of every list
+SIZES = {
+    'calculate_statistics': {'assets': [5]},
+    'all_pair_statistics': {'assets': [5, 50, 200]},
+    'step_markets': {'games': [1, 1000, 100000]},
+    'settle_decisions': {'players': [10, 10000]},
+    'leaderboard_update': {'players': [100, 10000]},
+    'store_load': {'players': [10, 1000], 'rounds': [15, 1000]},
+    'store_save': {'players': [10, 1000], 'rounds': [15, 1000]},
+    'correlation_round': {'assets': [5, 200], 'rounds': [1000]},
+    'plot_asset_prices': {'points': [30, 10000]},
+    'plot_heatmap': {'assets': [5, 50]},
+    'plot_decision_impact': {'decisions': [15, 10000]},
+    'plot_z_score_distribution': {'decisions': [15, 10000]},
+    'cold_import': {'module': ['engine', 'charts', 'plotly.graph_objects']},
+}
+
+LOAD_SIZES = {'sessions': [8, 64], 'games': [2]}
+
+MIN_SAMPLE_SECONDS = 0.02  # Calls are batched until one sample takes at least this long
+REPEAT = 7  # Samples per benchmark; the median is compared against the baseline
+DEFAULT_THRESHOLD = 0.25  # Allowed slowdown of the median before a benchmark counts as a regression
+
+# ============================
+# ====== TIMING ==============
+# ============================
+
+def time_call(func, repeat=REPEAT, min_seconds=MIN_SAMPLE_SECONDS):
+    """Seconds per call of `func`: median, min and max over `repeat` calibrated samples."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds or number >= 1 << 20:
+            break
+        number *= 2
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {'median': float(np.median(samples)), 'min': min(samples), 'max': max(samples), 'number': number}
+
+def parameter_grid(sizes, quick=False):
+    """All parameter combinations of a size grid as dicts."""
+    grid = [{}]
+    for name, values in sizes.items():
+        grid = [dict(params, **{name: value}) for params in grid for value in (values[:1] if quick else values)]
+    return grid
+
+def benchmark_key(name, params):
+    """Result key such as `store_load[players=10,rounds=15]`."""
+    return f"{name}[{','.join(f'{key}={value}' for key, value in params.items())}]"
+
+# ============================
+# ====== FIXTURES ============
+# ============================
+
+def played_game(num_players, num_rounds, rng):
+    """A game dict with `num_players` players that each decided in `num_rounds` rounds."""
+    game = new_game(seed=0, num_rounds=num_rounds + 1)
+    num_assets = len(game['assets'])
+    for _ in range(num_rounds):
+        game['asset_price_history'].append(game['asset_initial_prices'])
+    for k in range(num_players):
+        player = new_player()
+        for current_round in range(1, num_rounds + 1):
+            player['decisions'].append(current_round, k % len(asset_pairs(num_assets)), k % len(ACTIONS), 5,
+                                       1500, 0, True, float(rng.standard_normal()))
+        player['capital_history'] = [player['capital']] * (num_rounds + 1)
+        game['players'][f'player_{k}'] = player
+    game['current_round'] = num_rounds + 1
+    return game
+
+# ============================
+# ====== BENCHMARKS ==========
+# ============================
+
+# Each benchmark does its setup and returns the callable that is timed
+def bench_calculate_statistics(assets, directory):
+    prices = np.linspace(95, 110, assets)
+    rng = np.random.default_rng(0)
+    return lambda: calculate_statistics(prices, 0, 1, rng)
+
+def bench_all_pair_statistics(assets, directory):
+    history = simulate_round_history(np.linspace(95, 110, assets), 0)
+    return lambda: all_pair_statistics(history)
+
+def bench_step_markets(games, directory):
+    prices = np.full((games, 5), 100.0)
+    regimes = np.zeros(games, dtype=np.int8)
+    rng = np.random.default_rng(0)
+    return lambda: step_markets(prices, regimes, rng)
+
+def bench_settle_decisions(players, directory):
+    rng = np.random.default_rng(0)
+    z_scores = rng.standard_normal(players)
+    actions = rng.integers(len(ACTIONS), size=players)
+    risk_levels = rng.integers(1, 11, size=players)
+    return lambda: settle_decisions(z_scores, actions, risk_levels)
+
+def bench_leaderboard_update(players, directory):
+    rng = np.random.default_rng(0)
+    board = Leaderboard.from_players({
+        f'player_{k}': dict(new_player(), score=int(rng.integers(1000))) for k in range(players)
+    })
+    player = new_player()
+
+    def update():
+        player['score'] = int(rng.integers(1000))
+        board.update('player_0', player)
+    return update
+
+def bench_store_load(players, rounds, directory):
+    store = GameStore(os.path.join(directory, f'load_{players}_{rounds}.db'))
+    store.create_game('BENCH', played_game(players, rounds, np.random.default_rng(0)))
+
+    def load():
+        store.invalidate('BENCH')  # Measure a read from the database, not the in-memory cache
+        return store.load_game('BENCH')
+    return load
+
+def bench_store_save(players, rounds, directory):
+    store = GameStore(os.path.join(directory, f'save_{players}_{rounds}.db'))
+    store.create_game('BENCH', played_game(players, rounds, np.random.default_rng(0)))
+    game = store.load_game('BENCH')
+    prices = game['asset_initial_prices']
+    return lambda: store.save_game('BENCH', game, players=['player_0'], prices=prices)
+
+def bench_correlation_round(assets, rounds, directory):
+    names = [f'Asset {k}' for k in range(assets)]
+    game = new_game(seed=0, assets=names, initial_prices=np.full(assets, 100.0))
+    rows = 100 * (1 + 0.1 * np.random.default_rng(0).random((rounds + (1 << 16), assets)))
+    state = {'rounds': rounds}
+
+    def new_round():
+        # One more committed row, as after a round, then the matrix the heatmap would show
+        state['rounds'] = rounds + (state['rounds'] - rounds + 1) % (1 << 16)
+        game['asset_price_history'] = PriceHistory(names, rows[:state['rounds']])
+        return game_correlation('BENCH', game)
+    return new_round
+
+def bench_plot_asset_prices(points, directory):
+    rng = np.random.default_rng(0)
+    series_1, series_2 = 100 + rng.standard_normal((2, points)).cumsum(axis=1)
+    stats = calculate_statistics([100, 105], 0, 1, rng)[0]
+    return lambda: charts.plot_asset_prices(series_1, series_2, stats, 'Asset A & Asset B')
+
+def bench_plot_heatmap(assets, directory):
+    correlation = np.corrcoef(np.random.default_rng(0).standard_normal((assets, 100)))
+    names = [f'Asset {k}' for k in range(assets)]
+    return lambda: charts.plot_heatmap(correlation, names)
+
+def bench_plot_decision_impact(decisions, directory):
+    rng = np.random.default_rng(0)
+    rewards, penalties = rng.integers(0, 15000, size=(2, decisions))
+    return lambda: charts.plot_decision_impact(rewards, penalties)
+
+def bench_plot_z_score_distribution(decisions, directory):
+    z_scores = np.random.default_rng(0).standard_normal(decisions)
+    return lambda: charts.plot_z_score_distribution(z_scores)
+
+def bench_cold_import(module, directory):
+    # A fresh interpreter importing `module`, as on a cold start; includes interpreter startup
+    command = [sys.executable, '-c', f'import {module}']
+    root = os.path.dirname(os.path.abspath(__file__))
+    return lambda: subprocess.run(command, cwd=root, check=True)
+
+BENCHMARKS = {name: globals()[f'bench_{name}'] for name in SIZES}
+
+# ============================
+# ====== LOAD DRIVER =========
+# ============================
+
+def run_load(sessions, games, directory, num_rounds=15, round_seconds=0.05, seed=0):
+    """Replay `sessions` players joining `games` games and deciding in every round.
+
+    Each session runs in its own thread against one shared `GameEngine`,
+    like sessions of one Streamlit server: it joins, submits a decision,
+    waits for the round clock to close the round and repeats until its
+    game is over. Returns throughput, submit latency and lock wait metrics.
+    """
+    engine = GameEngine(GameStore(os.path.join(directory, f'load_{sessions}_{games}.db')), round_seconds=round_seconds)
+    game_codes = [f'LOAD{k}' for k in range(games)]
+    for game_code in game_codes:
+        engine.store.create_game(game_code, new_game(seed=seed, num_rounds=num_rounds))
+    pairs = asset_pairs(len(new_game(seed=seed)['assets']))
+    submit_latency = LatencyStats()
+    errors = []
+
+    def session(k):
+        try:
+            rng = np.random.default_rng([seed, k])
+            game_code, player_name = game_codes[k % games], f'session_{k}'
+            engine.join(game_code, player_name)
+            while True:
+                current_round, total_rounds = engine.store.round_info(game_code)
+                if current_round > total_rounds:
+                    return
+                pair = pairs[rng.integers(len(pairs))]
+                start = time.perf_counter()
+                engine.submit(game_code, player_name, pair, ACTIONS[rng.integers(len(ACTIONS))],
+                              int(rng.integers(1, 11)))
+                submit_latency.record(time.perf_counter() - start)
+                while engine.store.round_info(game_code)[0] == current_round:
+                    time.sleep(0.001)  # Sessions poll for the next round like the app's round watcher
+        except Exception as error:  # Reported after all sessions finished
+            errors.append(error)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(k,)) for k in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+
+    decisions = sum(len(player['decisions']) for game_code in game_codes
+                    for player in engine.store.load_game(game_code)['players'].values())
+    lock_stats = engine.lock_stats()
+    return {
+        'decisions': decisions,
+        'wall_seconds': wall_seconds,
+        'decisions_per_second': decisions / wall_seconds,
+        'submit_latency': submit_latency.summary(),
+        'lock_wait_max': max((stats['wait_max'] for stats in lock_stats.values()), default=0.0),
+        'write_conflicts': sum(stats['conflicts'] for stats in lock_stats.values())
+    }
+
+# ============================
+# ====== SUITE ===============
+# ============================
+
+def run_suite(pattern='*', quick=False, load=True):
+    """Run the benchmarks whose key matches the glob `pattern`; returns the results document."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, bench in BENCHMARKS.items():
+            for params in parameter_grid(SIZES[name], quick):
+                key = benchmark_key(name, params)
+                if fnmatch.fnmatch(key, pattern):
+                    results[key] = time_call(bench(directory=directory, **params))
+                    print(f"{key:<55}{results[key]['median'] * 1e6:>14.1f} us")
+        if load:
+            for params in parameter_grid(LOAD_SIZES, quick):
+                key = benchmark_key('load', params)
+                if fnmatch.fnmatch(key, pattern):
+                    report = run_load(directory=directory, **params)
+                    # Gated like the other benchmarks, on submit latency
+                    results[key] = dict(report, median=report['submit_latency']['p50'])
+                    print(f"{key:<55}{results[key]['median'] * 1e6:>14.1f} us  "
+                          f"({report['decisions_per_second']:.0f} decisions/s, "
+                          f"p95 submit {report['submit_latency']['p95'] * 1e3:.1f} ms)")
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'quick': quick
+        },
+        'results': results
+    }
+
+def compare(document, baseline, threshold=DEFAULT_THRESHOLD):
+    """Benchmarks whose median is more than `threshold` slower than the baseline's.
+
+    Returns `(key, baseline median, current median)` tuples; benchmarks
+    missing from either document are ignored.
+    """
+    regressions = []
+    for key, result in document['results'].items():
+        previous = baseline['results'].get(key)
+        if previous is not None and result['median'] > previous['median'] * (1 + threshold):
+            regressions.append((key, previous['median'], result['median']))
+    return regressions
+
+# ============================
+# ====== COMMAND LINE ========
+# ============================
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path benchmarks and regression gate for Statistical Arbitrage Showdown.")
+    parser.add_argument('--filter', default='*', help="Glob on benchmark keys, e.g. 'store_*'")
+    parser.add_argument('--quick', action='store_true', help="Smallest size of every benchmark only")
+    parser.add_argument('--no-load', action='store_true', help="Skip the multi-session load driver")
+    parser.add_argument('--output', help="Write results as JSON")
+    parser.add_argument('--compare', help="Baseline JSON; exit with status 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown against the baseline")
+    args = parser.parse_args()
+
+    document = run_suite(args.filter, quick=args.quick, load=not args.no_load)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(document, baseline, args.threshold)
+        for key, previous, current in regressions:
+            print(f"REGRESSION {key}: {previous * 1e6:.1f} us -> {current * 1e6:.1f} us "
+                  f"({current / previous - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# charts.py
+
+import numpy as np
+
+# ============================
+# ====== CONFIGURATION =======
+# ============================
+
+MAX_CHART_POINTS = 500  # Longer series are downsampled before they are sent to the browser
+Z_SCORE_BINS = 20
+
+# ============================
+# ====== DOWNSAMPLING ========
+# ============================
+
+def lttb(x, y, threshold=MAX_CHART_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling of a line to `threshold` points.
+
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with its neighbours, which preserves
+    the visual shape of the line. Series that are short enough are returned
+    unchanged.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return x, y
+
+    edges = np.linspace(1, length - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, length - 1
+    for k in range(threshold - 2):
+        start, end = edges[k], edges[k + 1]
+        next_end = edges[k + 2] if k + 2 < len(edges) else length
+        # Average of the next bucket is the third corner of the triangle
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        prev_x, prev_y = x[keep[k]], y[keep[k]]
+        areas = np.abs((prev_x - next_x) * (y[start:end] - prev_y) - (prev_x - x[start:end]) * (next_y - prev_y))
+        keep[k + 1] = start + int(areas.argmax())
+    return x[keep], y[keep]
+
+def bucket_sums(values, max_buckets=MAX_CHART_POINTS):
+    """Sum consecutive values into at most `max_buckets` buckets; returns (start index, sums)."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= max_buckets:
+        return np.arange(len(values)), values
+    starts = np.linspace(0, len(values), max_buckets, endpoint=False).astype(int)
+    return starts, np.add.reduceat(values, starts)
+
+# ============================
+# ====== FIGURES =============
+# ============================
+
+# Plotly is imported on the first figure rather than with this module, so pages and
+# processes that draw no chart (the landing page, tournaments) never load it
+
+def plot_capital_history(capital_history):
+    """Plot the capital history of a player."""
+    import plotly.graph_objects as go
+
+    rounds, capital = lttb(np.arange(1, len(capital_history) + 1), capital_history)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=rounds, y=capital,
+                             mode='lines+markers',
+                             name='Capital'))
+    fig.update_layout(title='📈 Capital Over Time',
+                      xaxis_title='Round',
+                      yaxis_title='Capital ($)',
+                      template='plotly_dark')
+    return fig
+
+def plot_asset_prices(price_series_1, price_series_2, stats_dict, asset_pair):
+    """Plot the asset prices along with statistical indicators."""
+    import plotly.graph_objects as go
+
+    name_1, name_2 = asset_pair.split(' & ')
+    time_index = np.arange(1, len(price_series_1) + 1)
+
+    fig = go.Figure()
+    for name, series in ((name_1, price_series_1), (name_2, price_series_2)):
+        x, y = lttb(time_index, series)
+        fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=name))
+
+    # Add Moving Averages and Bollinger Bands as shapes rather than data traces
+    fig.add_hline(y=stats_dict['ma_short_1'], line_dash='dash', line_color='#00cc96',
+                  annotation_text='MA Short 1', annotation_position='top left')
+    fig.add_hline(y=stats_dict['ma_long_1'], line_dash='dash', line_color='#ab63fa',
+                  annotation_text='MA Long 1', annotation_position='top left')
+    fig.add_hline(y=stats_dict['bollinger_upper'], line_dash='dot', line_color='rgba(255,0,0,0.5)',
+                  annotation_text='Bollinger Upper', annotation_position='top right')
+    fig.add_hline(y=stats_dict['bollinger_lower'], line_dash='dot', line_color='rgba(255,0,0,0.5)',
+                  annotation_text='Bollinger Lower', annotation_position='bottom right')
+
+    fig.update_layout(title=f'📉 Asset Prices and Indicators for {asset_pair}',
+                      xaxis_title='Time',
+                      yaxis_title='Price ($)',
+                      template='plotly_dark',
+                      legend=dict(x=0.01, y=0.99))
+    return fig
+
+def plot_heatmap(correlation_matrix, asset_names):
+    """Plot a heatmap of asset correlations."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Heatmap(z=correlation_matrix,
+                               x=asset_names,
+                               y=asset_names,
+                               colorscale='Viridis'))
+    # Same layout as an image plot: square cells, first asset at the top
+    fig.update_layout(title='🔍 Asset Correlation Heatmap',
+                      yaxis=dict(autorange='reversed', scaleanchor='x'),
+                      template='plotly_dark')
+    return fig
+
+def plot_z_score_distribution(z_scores):
+    """Plot the distribution of Z-Scores, binned before plotting so the payload stays bounded."""
+    import plotly.graph_objects as go
+
+    counts, edges = np.histogram(z_scores, bins=Z_SCORE_BINS)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name='Z-Score'))
+    fig.update_layout(title='📊 Z-Score Distribution',
+                      xaxis_title='Z-Score',
+                      yaxis_title='Frequency',
+                      bargap=0,
+                      template='plotly_dark')
+    return fig
+
+def plot_decision_impact(rewards, penalties):
+    """Plot the impact of player's decisions on their capital.
+
+    Long games are summed into at most `MAX_CHART_POINTS` bars, labelled by
+    the first round of each bucket.
+    """
+    import plotly.graph_objects as go
+
+    rounds, reward_sums = bucket_sums(rewards)
+    _, penalty_sums = bucket_sums(penalties)
+    rounds = rounds + 1
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=rounds, y=reward_sums, name='Rewards', marker_color='green'))
+    fig.add_trace(go.Bar(x=rounds, y=penalty_sums, name='Penalties', marker_color='red'))
+    fig.update_layout(title='📉 Decision Impact on Capital',
+                      xaxis_title='Round',
+                      yaxis_title='Amount ($)',
+                      barmode='relative',
+                      template='plotly_dark')
+    return fig
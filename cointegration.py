@@ -0,0 +1,181 @@
+# cointegration.py
+
+import math
+
+import numpy as np
+
+# ============================
+# ====== CONFIGURATION =======
+# ============================
+
+ADF_LAGS = 0  # Lagged differences in the ADF regression; histories are short
+MIN_OBSERVATIONS = 6  # Shortest history the tests are run on
+KALMAN_DELTA = 1e-4  # State noise of the Kalman hedge ratio (random walk)
+KALMAN_OBSERVATION_VAR = 1.0
+
+# MacKinnon (1994) response surface for the Engle-Granger test with a
+# constant and two I(1) series (the "c", N=2 row of his tables)
+EG_TAU_MAX = 0.92
+EG_TAU_MIN = -18.86
+EG_TAU_STAR = -2.62
+EG_TAU_SMALLP = [2.92, 1.5012, 0.039796]
+EG_TAU_LARGEP = [2.1945, 0.64695, -0.29198, -0.042377]
+
+# ============================
+# ====== REGRESSIONS =========
+# ============================
+
+def ols_hedge_ratios(y, x):
+    """Closed-form OLS of every row of `y` on the same row of `x`; returns (alpha, beta)."""
+    x_mean = x.mean(axis=-1, keepdims=True)
+    y_mean = y.mean(axis=-1, keepdims=True)
+    x_centered = x - x_mean
+    var_x = (x_centered ** 2).sum(axis=-1)
+    cov_xy = (x_centered * (y - y_mean)).sum(axis=-1)
+    beta = np.divide(cov_xy, var_x, out=np.zeros_like(var_x), where=var_x != 0)
+    return y_mean[..., 0] - beta * x_mean[..., 0], beta
+
+def rolling_ols(y, x, window):
+    """Rolling OLS of `y` on `x` from cumulative sums; returns (alpha, beta) per window end.
+
+    Output arrays have `T - window + 1` columns, the first one covering
+    observations `0 .. window - 1`.
+    """
+    def window_sums(values):
+        csum = np.cumsum(values, axis=-1)
+        csum = np.concatenate([np.zeros(csum.shape[:-1] + (1,)), csum], axis=-1)
+        return csum[..., window:] - csum[..., :-window]
+
+    sx, sy = window_sums(x), window_sums(y)
+    sxx, sxy = window_sums(x * x), window_sums(x * y)
+    denominator = window * sxx - sx * sx
+    beta = np.divide(window * sxy - sx * sy, denominator,
+                     out=np.zeros_like(denominator), where=denominator != 0)
+    return (sy - beta * sx) / window, beta
+
+def kalman_hedge_ratios(y, x, delta=KALMAN_DELTA, observation_var=KALMAN_OBSERVATION_VAR):
+    """Time-varying (beta, alpha) of every row of `y` on `x` with a Kalman filter.
+
+    The state follows a random walk; all rows are filtered together, so the
+    Python loop runs over time only. Returns (alpha, beta) of shape `(P, T)`.
+    """
+    y = np.atleast_2d(y)
+    x = np.atleast_2d(x)
+    num_pairs, length = y.shape
+    state = np.zeros((num_pairs, 2))  # [beta, alpha]
+    cov = np.zeros((num_pairs, 2, 2))
+    state_noise = delta / (1 - delta) * np.eye(2)
+    alphas = np.empty((num_pairs, length))
+    betas = np.empty((num_pairs, length))
+    for t in range(length):
+        observation = np.stack([x[:, t], np.ones(num_pairs)], axis=-1)
+        cov = cov + state_noise
+        error = y[:, t] - (observation * state).sum(axis=-1)
+        cov_obs = np.einsum('pi,pij->pj', observation, cov)
+        error_var = (cov_obs * observation).sum(axis=-1) + observation_var
+        gain = cov_obs / error_var[:, None]
+        state = state + gain * error[:, None]
+        cov = cov - gain[:, :, None] * cov_obs[:, None, :]
+        betas[:, t], alphas[:, t] = state[:, 0], state[:, 1]
+    return alphas, betas
+
+# ============================
+# ====== UNIT ROOT TESTS =====
+# ============================
+
+def adf_statistics(series, lags=ADF_LAGS):
+    """Augmented Dickey-Fuller t-statistics of every row, without a constant.
+
+    Regresses d(e)[t] on e[t-1] and `lags` lagged differences. The normal
+    equations of all rows are solved as one batched linear system.
+    """
+    series = np.atleast_2d(series)
+    diff = np.diff(series, axis=-1)
+    response = diff[:, lags:]
+    regressors = [series[:, lags:-1]]
+    regressors += [diff[:, lags - k:diff.shape[1] - k] for k in range(1, lags + 1)]
+    design = np.stack(regressors, axis=-1)  # (P, n, k + 1)
+    num_obs, num_params = design.shape[1], design.shape[2]
+
+    xtx = np.einsum('pni,pnj->pij', design, design)
+    xty = np.einsum('pni,pn->pi', design, response)
+    singular = np.abs(np.linalg.det(xtx)) < 1e-12
+    xtx[singular] = np.eye(num_params)
+    xtx_inv = np.linalg.inv(xtx)
+    coefs = np.einsum('pij,pj->pi', xtx_inv, xty)
+    residuals = response - np.einsum('pni,pi->pn', design, coefs)
+    sigma2 = (residuals ** 2).sum(axis=-1) / (num_obs - num_params)
+    std_error = np.sqrt(sigma2 * xtx_inv[:, 0, 0])
+    t_stats = np.divide(coefs[:, 0], std_error, out=np.zeros(len(std_error)), where=std_error > 0)
+    t_stats[singular] = np.nan
+    return t_stats
+
+def engle_granger_p_values(t_stats):
+    """MacKinnon approximate p-values of Engle-Granger t-statistics."""
+    t_stats = np.asarray(t_stats, dtype=np.float64)
+    small = np.polyval(EG_TAU_SMALLP[::-1], t_stats)
+    large = np.polyval(EG_TAU_LARGEP[::-1], t_stats)
+    z = np.where(t_stats <= EG_TAU_STAR, small, large)
+    p_values = 0.5 * np.vectorize(math.erfc, otypes=[float])(-np.nan_to_num(z) / math.sqrt(2))
+    p_values = np.where(t_stats > EG_TAU_MAX, 1.0, p_values)
+    p_values = np.where(t_stats < EG_TAU_MIN, 0.0, p_values)
+    return np.where(np.isnan(t_stats), np.nan, p_values)
+
+def half_lives(spread):
+    """Half-life of mean reversion of every row, from d(s)[t] = c + lambda * s[t-1].
+
+    Rows that do not mean-revert (lambda >= 0) get an infinite half-life.
+    """
+    _, decay = ols_hedge_ratios(np.diff(spread, axis=-1), spread[..., :-1])
+    with np.errstate(divide='ignore'):
+        return np.where(decay < 0, -np.log(2) / np.where(decay < 0, decay, -1), np.inf)
+
+def rolling_z_scores(spread, window):
+    """Z-score of the last value of every row against its trailing `window`."""
+    recent = spread[..., -window:]
+    std = recent.std(axis=-1)
+    return np.divide(spread[..., -1] - recent.mean(axis=-1), std, out=np.zeros_like(std), where=std != 0)
+
+# ============================
+# ====== PAIR ANALYSIS =======
+# ============================
+
+def pair_cointegration(prices, window=20, lags=ADF_LAGS, time_varying=False):
+    """Hedge ratios and Engle-Granger statistics for all pairs of an `(N, T)` price array.
+
+    Asset `i` of each `(i, j)` pair is regressed on asset `j`. Every entry
+    is an array indexed like `pairs`; histories shorter than
+    `MIN_OBSERVATIONS + lags` give NaN test results. With `time_varying`,
+    the latest hedge ratios of a rolling `window` OLS and of the Kalman
+    filter are added as `rolling_hedge_ratio` and `kalman_hedge_ratio`.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    first, second = np.triu_indices(prices.shape[0], k=1)
+    y, x = prices[first], prices[second]
+    num_pairs, length = y.shape
+
+    alpha, beta = ols_hedge_ratios(y, x)
+    spread = y - alpha[:, None] - beta[:, None] * x
+    result = {
+        'pairs': np.column_stack([first, second]),
+        'hedge_ratio': beta,
+        'intercept': alpha,
+        'adf_statistic': np.full(num_pairs, np.nan),
+        'coint_p_value': np.full(num_pairs, np.nan),
+        'half_life': np.full(num_pairs, np.nan),
+        'spread_z_score': np.full(num_pairs, np.nan)
+    }
+    if time_varying:
+        result['rolling_hedge_ratio'] = np.full(num_pairs, np.nan)
+        result['kalman_hedge_ratio'] = np.full(num_pairs, np.nan)
+    if length < MIN_OBSERVATIONS + lags or num_pairs == 0:
+        return result
+
+    if time_varying:
+        result['rolling_hedge_ratio'] = rolling_ols(y, x, min(window, length))[1][:, -1]
+        result['kalman_hedge_ratio'] = kalman_hedge_ratios(y, x)[1][:, -1]
+    result['adf_statistic'] = adf_statistics(spread, lags)
+    result['coint_p_value'] = engle_granger_p_values(result['adf_statistic'])
+    result['half_life'] = half_lives(spread)
+    result['spread_z_score'] = rolling_z_scores(spread, min(window, length))
+    return result
@@ -0,0 +1,107 @@
+# decisions.py
+
+import time
+
+import numpy as np
+
+from indicators import pair_code
+
+# ============================
+# ====== DECISION LOG ========
+# ============================
+
+# Player actions, indexed by their integer action code
+ACTIONS = ("🔼 Go Long", "🔽 Go Short", "⏸️ Hold")
+
+# One fixed-size record per decision; `pair` indexes `asset_pairs(len(assets))`,
+# `action` indexes ACTIONS and `timestamp` is in epoch milliseconds
+DECISION_DTYPE = np.dtype([
+    ('round', '<i4'),
+    ('pair', '<i4'),
+    ('action', 'i1'),
+    ('risk_level', 'i1'),
+    ('successful', '?'),
+    ('reward', '<i8'),
+    ('penalty', '<i8'),
+    ('timestamp', '<i8'),
+    ('z_score', '<f8')
+])
+
+# Records written before pair codes were widened, which only fit games of up to 256 assets
+LEGACY_DECISION_DTYPE = np.dtype([(name, '<i2' if name == 'pair' else DECISION_DTYPE[name])
+                                  for name in DECISION_DTYPE.names])
+
+
+def epoch_millis():
+    """Current time in integer epoch milliseconds."""
+    return time.time_ns() // 1_000_000
+
+
+class DecisionLog:
+    """A player's decisions as one NumPy structured array, one record per decision.
+
+    Columns are read as views, e.g. `log['reward']`, so charts get typed
+    arrays without building lists. The log serializes to the raw record
+    bytes and `from_bytes` wraps such a buffer without copying; the buffer
+    is only copied, with room to grow, on the first append.
+    """
+
+    def __init__(self, records=None):
+        self._records = np.empty(0, dtype=DECISION_DTYPE) if records is None else records
+        self._size = len(self._records)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Wrap serialized records; the log shares `data` until it is appended to."""
+        return cls(np.frombuffer(data, dtype=DECISION_DTYPE))
+
+    @classmethod
+    def from_legacy_bytes(cls, data):
+        """Convert records serialized with `LEGACY_DECISION_DTYPE`."""
+        legacy = np.frombuffer(data, dtype=LEGACY_DECISION_DTYPE)
+        records = np.empty(len(legacy), dtype=DECISION_DTYPE)
+        for name in DECISION_DTYPE.names:
+            records[name] = legacy[name]
+        return cls(records)
+
+    @classmethod
+    def from_dicts(cls, decisions, assets):
+        """Convert a legacy list of decision dicts, given the game's assets."""
+        asset_index = {asset: i for i, asset in enumerate(assets)}
+        log = cls()
+        for decision in decisions:
+            i, j = (asset_index[asset] for asset in decision['asset_pair'].split(' & '))
+            log.append(
+                decision['round'], pair_code(len(assets), i, j), ACTIONS.index(decision['action']),
+                decision['risk_level'], decision['reward'], decision['penalty'], decision['successful'],
+                decision['z_score'],
+                int(np.datetime64(decision['timestamp'], 'ms').astype(np.int64))
+            )
+        return log
+
+    def to_bytes(self):
+        """Serialize the records."""
+        return self._records[:self._size].tobytes()
+
+    def append(self, round, pair, action, risk_level, reward, penalty, successful, z_score, timestamp=None):
+        """Add one decision; capacity doubles when full, so appends are amortized O(1)."""
+        if self._size == len(self._records) or not self._records.flags.writeable:
+            grown = np.empty(max(2 * self._size, 16), dtype=DECISION_DTYPE)
+            grown[:self._size] = self._records[:self._size]
+            self._records = grown
+        self._records[self._size] = (round, pair, action, risk_level, successful, reward, penalty,
+                                     epoch_millis() if timestamp is None else timestamp, z_score)
+        self._size += 1
+
+    def record(self, index):
+        """One decision as a dict of plain Python values."""
+        return dict(zip(DECISION_DTYPE.names, self._records[:self._size][index].item()))
+
+    def __getitem__(self, column):
+        """Read-only view of one column."""
+        view = self._records[column][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,552 @@
+# engine.py
+
+import random
+import threading
+import time
+
+import numpy as np
+
+from decisions import ACTIONS, DecisionLog, epoch_millis
+from indicators import (all_pair_statistics, game_round_statistics, load_indicators, pair_code, pair_from_code,
+                        simulate_round_history)
+from leaderboard import Leaderboard
+from market import generate_market_conditions, generate_regimes, get_rng, simulate_market, step_markets
+from metrics import inc
+from price_history import PriceHistory
+from storage import GameLocks, VersionConflict
+
+# ============================
+# ====== GAME RULES ==========
+# ============================
+
+NUM_ROUNDS = 15  # Increased number of rounds for added difficulty
+ASSETS = ['Asset A', 'Asset B', 'Asset C', 'Asset D', 'Asset E']
+INITIAL_PRICES = [100, 105, 110, 95, 102]
+INITIAL_CAPITAL = 200000
+
+REWARD_PER_RISK = 1500  # Increased reward for higher difficulty
+PENALTY_PER_RISK = 700  # Increased penalty for higher difficulty
+SCORE_DIVISOR = 150  # Adjusted scoring
+Z_SCORE_THRESHOLD = 1
+
+# Integer codes of the player actions in ACTIONS
+LONG, SHORT, HOLD = range(len(ACTIONS))
+
+# Seconds a round stays open after its first decision, unless every player decides sooner
+ROUND_SECONDS = 60
+
+# Attempts of a versioned write before giving up on a game changed by other processes,
+# with a random wait of up to WRITE_BACKOFF_SECONDS * 2**attempt (capped) between them
+MAX_WRITE_ATTEMPTS = 12
+WRITE_BACKOFF_SECONDS = 0.005
+MAX_WRITE_BACKOFF_SECONDS = 0.5
+
+
+def new_game(seed=None, num_rounds=NUM_ROUNDS, assets=ASSETS, initial_prices=INITIAL_PRICES):
+    """Create the state of a new game."""
+    if seed is None:
+        seed = random.getrandbits(32)  # Seeds the market conditions and per-round statistics
+    return {
+        'seed': seed,
+        'players': {},
+        'current_round': 1,
+        'num_rounds': num_rounds,
+        'assets': list(assets),
+        'asset_initial_prices': list(initial_prices),
+        'asset_price_history': PriceHistory(assets, pending=[initial_prices]),
+        'capital_history': {},  # Populated per player
+        'market_conditions': generate_market_conditions(num_rounds, seed)
+    }
+
+def new_player():
+    """Create the state of a player who just joined."""
+    return {
+        'capital': INITIAL_CAPITAL,
+        'score': 0,
+        'penalties': 0,
+        'decisions': DecisionLog(),
+        'capital_history': [INITIAL_CAPITAL]
+    }
+
+def settle_decisions(z_scores, actions, risk_levels,
+                     reward_per_risk=REWARD_PER_RISK, penalty_per_risk=PENALTY_PER_RISK):
+    """Rewards, penalties and success flags for arrays of decisions.
+
+    A long succeeds when the z-score is above the threshold and a short when
+    it is below minus the threshold; a hold neither wins nor loses.
+    """
+    z_scores, actions, risk_levels = np.broadcast_arrays(z_scores, actions, risk_levels)
+    successful = ((actions == LONG) & (z_scores > Z_SCORE_THRESHOLD)) | \
+                 ((actions == SHORT) & (z_scores < -Z_SCORE_THRESHOLD))
+    failed = (actions != HOLD) & ~successful
+    rewards = np.where(successful, risk_levels * reward_per_risk, 0)
+    penalties = np.where(failed, risk_levels * penalty_per_risk, 0)
+    return rewards, penalties, successful
+
+def settle_decision(z_score, action, risk_level):
+    """Reward, penalty and success flag of one decision; `action` is an action label."""
+    reward, penalty, successful = settle_decisions(z_score, ACTIONS.index(action), risk_level)
+    return int(reward), int(penalty), bool(successful)
+
+def apply_decision(game, player_name, pair, action, risk_level, z_score, outcome=None, timestamp=None):
+    """Settle a player's decision on asset pair `(i, j)` and record it; returns the outcome dict.
+
+    `outcome` is a precomputed `(reward, penalty, successful)`, e.g. from a
+    batch settled with `settle_decisions`; `timestamp` is in epoch milliseconds.
+    """
+    player = game['players'][player_name]
+    reward, penalty, successful = outcome or settle_decision(z_score, action, risk_level)
+    player['capital'] += reward - penalty
+    player['score'] += reward // SCORE_DIVISOR
+    player['penalties'] += penalty
+
+    # Update Capital History
+    player['capital_history'].append(player['capital'])
+
+    # Record Decision
+    player['decisions'].append(game['current_round'], pair_code(len(game['assets']), *pair), ACTIONS.index(action),
+                               risk_level, reward, penalty, successful, z_score, timestamp)
+    return decision_dict(game, player['decisions'].record(-1))
+
+def decision_dict(game, record):
+    """Readable form of a decision log record, with the asset pair and action labels."""
+    i, j = pair_from_code(len(game['assets']), record['pair'])
+    return dict(record, asset_pair=f"{game['assets'][i]} & {game['assets'][j]}", action=ACTIONS[record['action']])
+
+def settle_round(game, decisions, round_statistics):
+    """Settle the queued decisions of a round in one batch and record them.
+
+    `decisions` maps player names to dicts with the `pair` `(i, j)`, the
+    `action` label, `risk_level` and submission `timestamp`;
+    `round_statistics` is the round's `game_round_statistics`. Returns the
+    recorded decisions by player.
+    """
+    names = list(decisions)
+    pairs = [tuple(decisions[name]['pair']) for name in names]
+    z_scores = [round_statistics[pair][0]['z_score'] for pair in pairs]
+    rewards, penalties, successful = settle_decisions(
+        np.array(z_scores, dtype=float),
+        np.array([ACTIONS.index(decisions[name]['action']) for name in names], dtype=int),
+        np.array([decisions[name]['risk_level'] for name in names], dtype=int)
+    )
+    settled = {}
+    for k, name in enumerate(names):
+        decision = decisions[name]
+        outcome = int(rewards[k]), int(penalties[k]), bool(successful[k])
+        settled[name] = apply_decision(game, name, pairs[k], decision['action'], decision['risk_level'],
+                                       z_scores[k], outcome, decision['timestamp'])
+    return settled
+
+def advance_game_round(game, rng=None):
+    """Record the round's prices, simulate the market and move to the next round.
+
+    Returns the prices that were appended to the price history.
+    """
+    round_prices = game['asset_initial_prices']
+    indicators = load_indicators(game)
+    game['asset_price_history'].append(round_prices)
+    indicators.append(round_prices)
+    game['indicator_state'] = indicators.to_bytes()
+
+    # Simulate Market for Next Round
+    current_market = game['market_conditions'][game['current_round'] - 1]
+    game['asset_initial_prices'] = simulate_market(round_prices, current_market, rng)
+
+    # Move to Next Round
+    game['current_round'] += 1
+    return round_prices
+
+def is_over(game):
+    """Check whether all rounds of a game have been played."""
+    return game['current_round'] > game['num_rounds']
+
+# ============================
+# ====== GAME ENGINE =========
+# ============================
+
+class GameEngine:
+    """Game rules on top of a `GameStore`, usable without a Streamlit session.
+
+    Leaderboards are kept in memory per game and updated one player at a
+    time; they are rebuilt only when the game was changed elsewhere.
+
+    Writes to a game hold its lock in `locks`, so sessions of one server
+    never interleave on the same game while other games stay unblocked.
+    Each write is also a compare-and-swap on the game version and is
+    replayed on a fresh copy when another process got there first.
+
+    In multiplayer games players `submit` decisions for the current round
+    and `close_round` settles them all at once, advancing the game a single
+    time. With `round_seconds`, a `RoundClock` closes each round when every
+    player has decided or the time is up; without it, rounds are closed by
+    the caller.
+    """
+
+    def __init__(self, store, round_seconds=None):
+        self.store = store
+        self.locks = GameLocks()
+        self.clock = RoundClock(self, round_seconds) if round_seconds else None
+        self._leaderboards = {}
+        self._leaderboard_lock = threading.Lock()
+        # Decisions queued before a restart have no timer in this process yet
+        for game_code in self.store.games_with_pending_decisions():
+            self.resume_clock(game_code)
+
+    def create_game(self, game_code, seed=None):
+        """Create a game unless it already exists; returns True if it was created."""
+        return self.store.create_game(game_code, new_game(seed))
+
+    def join(self, game_code, player_name):
+        """Add a player to a game; returns False if they had already joined."""
+        with self.locks.hold(game_code):
+            if self.store.has_player(game_code, player_name):
+                return False
+            player = new_player()
+            version = self.store.save_player(game_code, player_name, player)
+            self._update_leaderboard(game_code, {player_name: player}, version)
+        return True
+
+    def submit(self, game_code, player_name, pair, action, risk_level):
+        """Queue a player's decision on asset pair `(i, j)` for the current round.
+
+        Returns the round the decision was queued for, or None if the game
+        is over, the player has not joined or already decided this round.
+        Raises `ValueError` for a pair that is not `i < j` within the game's
+        assets, an unknown action or a risk level outside 1-10, so that no
+        decision that cannot be settled is ever queued.
+        """
+        game = self.store.load_game(game_code, copy=False)
+        if game is None or is_over(game) or not self.store.has_player(game_code, player_name):
+            return None
+        i, j = (int(index) for index in pair)
+        if not 0 <= i < j < len(game['assets']):
+            raise ValueError(f"Invalid asset pair {tuple(pair)} for {len(game['assets'])} assets")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action!r}; expected one of {list(ACTIONS)}")
+        if not 1 <= int(risk_level) <= 10:
+            raise ValueError(f"Risk level {risk_level} is outside 1-10")
+        decision = {'pair': [i, j], 'action': action, 'risk_level': int(risk_level), 'timestamp': epoch_millis()}
+        current_round = game['current_round']
+        if not self.store.submit_decision(game_code, current_round, player_name, decision):
+            return None
+        inc('decisions_total', game=game_code)
+        if self.clock is not None:
+            self.clock.notify(game_code)
+        return current_round
+
+    def resume_clock(self, game_code):
+        """Start the round timer of a game whose current round has queued decisions but no running timer.
+
+        Timers live in memory, so after a restart nothing would otherwise
+        close a round whose players have all submitted already. Returns True
+        if a timer was started.
+        """
+        if self.clock is None or self.clock.running(game_code) or not self.pending(game_code):
+            return False
+        self.clock.notify(game_code)
+        return True
+
+    def pending(self, game_code):
+        """Decisions queued for the current round of a game, by player name."""
+        round_info = self.store.round_info(game_code)
+        return {} if round_info is None else self.store.pending_decisions(game_code, round_info[0])
+
+    def round_complete(self, game_code):
+        """Check whether every player of a game has decided in the current round."""
+        return len(self.pending(game_code)) >= len(self.leaderboard(game_code))
+
+    def close_round(self, game_code):
+        """Settle all queued decisions of the current round and advance the round once.
+
+        All decisions are judged on the round's precomputed statistics and
+        written in one transaction. Returns the recorded decisions by player,
+        or None if nothing was queued or the game is over.
+        """
+        def play(game, queued):
+            if not queued:
+                return None
+            settled = settle_round(game, queued, game_round_statistics(game_code, game))
+            game.pop('leaderboard', None)  # Materialized by older versions; now kept in memory
+            return list(settled), settled
+
+        result = self._play_round(game_code, play)
+        if result is None:
+            return None
+        game, version, players, settled = result
+        inc('rounds_closed_total', game=game_code)
+        self._update_leaderboard(game_code, {name: game['players'][name] for name in players}, version)
+
+        # Precompute the statistics of the new round
+        if not is_over(game):
+            game_round_statistics(game_code, game)
+        return settled
+
+    def decide(self, game_code, player_name, pair, action, risk_level):
+        """Settle a player's decision on asset pair `(i, j)` and advance the round.
+
+        The decision is judged on the round's precomputed z-score for the
+        pair, which is the one shown to the player; decisions other players
+        queued for the round are settled with it. Returns the recorded
+        decision, or None if the game is over.
+        """
+        def play(game, queued):
+            stats_dict = game_round_statistics(game_code, game)[pair][0]
+            decision = apply_decision(game, player_name, pair, action, risk_level, stats_dict['z_score'])
+            game.pop('leaderboard', None)  # Materialized by older versions; now kept in memory
+            return [player_name], decision
+
+        result = self._play_round(game_code, play)
+        if result is None:
+            return None
+        game, version, players, decision = result
+        inc('decisions_total', game=game_code)
+        self._update_leaderboard(game_code, {name: game['players'][name] for name in players}, version)
+
+        # Precompute the statistics of the new round
+        if not is_over(game):
+            game_round_statistics(game_code, game)
+        return decision
+
+    def advance_round(self, game_code):
+        """Advance a game to its next round; returns False if it is over.
+
+        Decisions queued for the round are settled first, as when it is closed.
+        """
+        result = self._play_round(game_code, lambda game, queued: ((), None))
+        if result is None:
+            return False
+        game, version, players, _ = result
+        self._update_leaderboard(game_code, {name: game['players'][name] for name in players}, version)
+        return True
+
+    def _play_round(self, game_code, play):
+        """Apply `play(game, queued)`, advance the round and save, retrying on version conflicts.
+
+        `queued` holds the decisions queued for the round by player name;
+        `play` returns `(changed players, result)`, or None to leave the game
+        untouched. Queued decisions of players `play` did not change are
+        settled as well, so no round is left with decisions that can never be
+        settled. Only the game row, the changed players and the new price
+        round are written, and the round's queued decisions are removed in the
+        same transaction. Returns `(game, version, changed players, result)`,
+        or None if nothing was written.
+
+        After a conflict the lock is released for a jittered, exponentially
+        growing wait, so writers in several processes stop colliding on the
+        same game instead of retrying in lockstep.
+        """
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, min(WRITE_BACKOFF_SECONDS * 2 ** attempt, MAX_WRITE_BACKOFF_SECONDS)))
+            with self.locks.hold(game_code):
+                expected_version, game = self.store.load_game_versioned(game_code)
+                if is_over(game):
+                    return None
+                played_round = game['current_round']
+                queued = self.store.pending_decisions(game_code, played_round)
+                played = play(game, queued)
+                if played is None:
+                    return None
+                players, outcome = played
+                unsettled = {name: decision for name, decision in queued.items() if name not in players}
+                if unsettled:
+                    players = [*players, *settle_round(game, unsettled, game_round_statistics(game_code, game))]
+                round_prices = advance_game_round(game)
+                try:
+                    version = self.store.save_game(
+                        game_code, game, players=players, prices=round_prices, expected_version=expected_version,
+                        settled_round=played_round
+                    )
+                except VersionConflict:
+                    self.locks.record_conflict(game_code)
+                    continue
+                return game, version, players, outcome
+        raise VersionConflict(f"Game '{game_code}' kept changing; gave up after {MAX_WRITE_ATTEMPTS} attempts")
+
+    def lock_stats(self):
+        """Per-game lock wait and write retry metrics, see `GameLocks.stats`."""
+        return self.locks.stats()
+
+    def leaderboard(self, game_code):
+        """Current `Leaderboard` of a game; callers must not modify it."""
+        version = self.store.version(game_code)
+        with self._leaderboard_lock:
+            board = self._leaderboards.get(game_code)
+            if board is None or board.version != version:
+                board = Leaderboard.from_players(self.store.load_game(game_code, copy=False)['players'], version)
+                self._leaderboards[game_code] = board
+            return board
+
+    def _update_leaderboard(self, game_code, players, version):
+        """Move the given players on a game's board after a write that produced `version`."""
+        with self._leaderboard_lock:
+            board = self._leaderboards.get(game_code)
+            if board is None:
+                return
+            if board.version is not None and version == board.version + 1:
+                for player_name, player in players.items():
+                    board.update(player_name, player)
+                board.version = version
+            else:
+                # The game was also changed elsewhere; rebuild on the next read
+                del self._leaderboards[game_code]
+
+# ============================
+# ====== ROUND CLOCK =========
+# ============================
+
+class RoundClock:
+    """Closes the rounds of a `GameEngine`'s games in the background.
+
+    The first decision of a round starts a timer thread for its game. The
+    round is closed as soon as every player has decided, or `round_seconds`
+    later with whatever was submitted, and the thread keeps going while
+    decisions are queued for the next round. Idle games have no thread.
+    """
+
+    def __init__(self, engine, round_seconds=ROUND_SECONDS):
+        self.engine = engine
+        self.round_seconds = round_seconds
+        self._wakeups = {}  # game_code -> Event of the game's running timer
+        self._guard = threading.Lock()
+
+    def running(self, game_code):
+        """Check whether a game's timer is running."""
+        with self._guard:
+            return game_code in self._wakeups
+
+    def notify(self, game_code):
+        """Signal a new decision in a game, starting its timer if none is running."""
+        with self._guard:
+            wakeup = self._wakeups.get(game_code)
+            if wakeup is not None:
+                wakeup.set()
+                return
+            wakeup = self._wakeups[game_code] = threading.Event()
+        threading.Thread(
+            target=self._run, args=(game_code, wakeup), name=f'round-clock-{game_code}', daemon=True
+        ).start()
+
+    def _run(self, game_code, wakeup):
+        """Close rounds of a game until no decision is queued."""
+        try:
+            while True:
+                # Counted from the round's first decision, which may predate this timer after a restart
+                pending = self.engine.pending(game_code)
+                first_decision = min((decision['timestamp'] for decision in pending.values()), default=epoch_millis())
+                elapsed = max(epoch_millis() - first_decision, 0) / 1000
+                deadline = time.monotonic() + max(self.round_seconds - elapsed, 0)
+                while not self.engine.round_complete(game_code):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    wakeup.wait(remaining)
+                    wakeup.clear()
+                try:
+                    self.engine.close_round(game_code)
+                except VersionConflict:
+                    pass  # Still pending; retried on the next pass
+                with self._guard:
+                    if not self.engine.pending(game_code):
+                        del self._wakeups[game_code]
+                        return
+        except BaseException:
+            with self._guard:
+                self._wakeups.pop(game_code, None)
+            raise
+
+# ============================
+# ====== BATCH SIMULATION ====
+# ============================
+
+def threshold_strategy(threshold=1.0, risk_level=5):
+    """Trade the pair with the largest |z-score| when it is beyond `threshold`."""
+    def strategy(stats, rng):
+        z_scores = stats['z_score']
+        pair = np.abs(z_scores).argmax(axis=-1)
+        z_score = np.take_along_axis(z_scores, pair[:, None], axis=-1)[:, 0]
+        action = np.where(z_score > threshold, LONG, np.where(z_score < -threshold, SHORT, HOLD))
+        return pair, action, np.full(len(pair), risk_level)
+    return strategy
+
+def random_strategy(risk_level=None):
+    """Random pair and action; random risk level unless `risk_level` is given."""
+    def strategy(stats, rng):
+        num_games, num_pairs = stats['z_score'].shape
+        pair = rng.integers(num_pairs, size=num_games)
+        action = rng.integers(len(ACTIONS), size=num_games)
+        risk = rng.integers(1, 11, size=num_games) if risk_level is None else np.full(num_games, risk_level)
+        return pair, action, risk
+    return strategy
+
+def rsi_filter_strategy(threshold=1.0, oversold=30, overbought=70, risk_level=5):
+    """Threshold rule that skips longs on overbought and shorts on oversold assets."""
+    def strategy(stats, rng):
+        pair, action, risk = threshold_strategy(threshold, risk_level)(stats, rng)
+        rsi = np.take_along_axis(stats['rsi'], pair[:, None], axis=-1)[:, 0]
+        action = np.where((action == LONG) & (rsi >= overbought), HOLD, action)
+        action = np.where((action == SHORT) & (rsi <= oversold), HOLD, action)
+        return pair, action, risk
+    return strategy
+
+def macd_filter_strategy(threshold=1.0, risk_level=5):
+    """Threshold rule that only trades in the direction of the MACD histogram."""
+    def strategy(stats, rng):
+        pair, action, risk = threshold_strategy(threshold, risk_level)(stats, rng)
+        macd_hist = np.take_along_axis(stats['macd_hist'], pair[:, None], axis=-1)[:, 0]
+        action = np.where((action == LONG) & (macd_hist <= 0), HOLD, action)
+        action = np.where((action == SHORT) & (macd_hist >= 0), HOLD, action)
+        return pair, action, risk
+    return strategy
+
+def hold_strategy():
+    """Never trade."""
+    def strategy(stats, rng):
+        num_games = stats['z_score'].shape[0]
+        return np.zeros(num_games, dtype=int), np.full(num_games, HOLD), np.ones(num_games, dtype=int)
+    return strategy
+
+def simulate_games(num_games, strategies, num_rounds=NUM_ROUNDS, seed=None,
+                   initial_prices=INITIAL_PRICES, reward_per_risk=REWARD_PER_RISK,
+                   penalty_per_risk=PENALTY_PER_RISK):
+    """Play `num_games` games at once, one scripted player per strategy in every game.
+
+    `strategies` maps names to callables `(stats, rng) -> (pair, action, risk_level)`,
+    where `stats` is the `(games, pairs)` output of `all_pair_statistics` and
+    each returned array has one entry per game. All games advance together,
+    so the Python loop runs over rounds and strategies only. Returns a dict
+    mapping each strategy name to arrays of final capital, score, penalties,
+    successes and trades per game.
+
+    Markets and strategies draw from separate streams, so runs with the same
+    seed see the same markets whichever strategies take part.
+    """
+    rng, strategy_rng = get_rng(seed).spawn(2)
+    names = list(strategies)
+    prices = np.tile(np.asarray(initial_prices, dtype=np.float64), (num_games, 1))
+    regimes = generate_regimes(num_rounds, rng, num_games=num_games)
+    totals = {
+        name: {key: np.zeros(num_games, dtype=np.int64)
+               for key in ('capital', 'score', 'penalties', 'successes', 'trades')}
+        for name in names
+    }
+    for name in names:
+        totals[name]['capital'] += INITIAL_CAPITAL
+
+    for current_round in range(num_rounds):
+        stats = all_pair_statistics(simulate_round_history(prices, rng), with_cointegration=False)
+        stats['z_score'] = np.round(stats['z_score'], 2)  # Players see rounded z-scores
+        for name in names:
+            pair, action, risk_level = strategies[name](stats, strategy_rng)
+            z_score = np.take_along_axis(stats['z_score'], np.asarray(pair)[:, None], axis=-1)[:, 0]
+            rewards, penalties, successful = settle_decisions(
+                z_score, action, risk_level, reward_per_risk, penalty_per_risk
+            )
+            result = totals[name]
+            result['capital'] += rewards - penalties
+            result['score'] += rewards // SCORE_DIVISOR
+            result['penalties'] += penalties
+            result['successes'] += successful
+            result['trades'] += np.asarray(action) != HOLD
+        prices = step_markets(prices, regimes[:, current_round], rng)
+    return totals
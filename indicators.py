@@ -0,0 +1,486 @@
+# indicators.py
+
+from functools import lru_cache
+import math
+import threading
+import zlib
+
+import numpy as np
+
+from cointegration import pair_cointegration
+from market import get_rng
+
+# ============================
+# ====== CONFIGURATION =======
+# ============================
+
+HISTORY_DAYS = 30  # Length of the simulated price history behind each round
+MA_SHORT_WINDOW = 5
+MA_LONG_WINDOW = 20
+RSI_WINDOW = 14
+MACD_FAST_SPAN = 12
+MACD_SLOW_SPAN = 26
+MACD_SIGNAL_SPAN = 9
+
+# ============================
+# ====== BATCHED ENGINE ======
+# ============================
+
+def asset_pairs(num_assets):
+    """List all `(i, j)` asset index pairs with `i < j`."""
+    return [(i, j) for i in range(num_assets) for j in range(i + 1, num_assets)]
+
+def pair_code(num_assets, i, j):
+    """Position of pair `(i, j)`, `i < j`, in `asset_pairs(num_assets)`, in O(1)."""
+    return i * (2 * num_assets - i - 1) // 2 + j - i - 1
+
+def pair_from_code(num_assets, code):
+    """Inverse of `pair_code`: the pair `(i, j)` at position `code` of `asset_pairs(num_assets)`."""
+    # Row i starts at pair_code(num_assets, i, i + 1); solve the quadratic for the last start <= code
+    i = int((2 * num_assets - 1 - math.sqrt((2 * num_assets - 1) ** 2 - 8 * code)) // 2)
+    while pair_code(num_assets, i, i + 1) > code:
+        i -= 1
+    while i + 1 < num_assets - 1 and pair_code(num_assets, i + 1, i + 2) <= code:
+        i += 1
+    return i, code - pair_code(num_assets, i, i + 1) + i + 1
+
+def trailing_means(prices, window):
+    """Mean of the last `window` values of every row, from one cumulative sum."""
+    csum = np.cumsum(prices, axis=-1)
+    if window >= prices.shape[-1]:
+        return csum[..., -1] / prices.shape[-1]
+    return (csum[..., -1] - csum[..., -window - 1]) / window
+
+def ewm_last(prices, span):
+    """Last value of the `adjust=False` EWM of every row.
+
+    The recurrence y[t] = (1 - a) * y[t-1] + a * x[t] with y[0] = x[0] is
+    unrolled into a single weight vector, so all rows take one dot product.
+    """
+    alpha = 2 / (span + 1)
+    length = prices.shape[-1]
+    weights = alpha * (1 - alpha) ** np.arange(length - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (length - 1)
+    return prices @ weights
+
+def relative_strength(prices, window=RSI_WINDOW):
+    """RSI of every row over the last `window` price changes."""
+    delta = np.diff(prices, axis=-1)[..., -window:]
+    avg_gain = np.where(delta > 0, delta, 0).mean(axis=-1)
+    avg_loss = np.where(delta < 0, -delta, 0).mean(axis=-1)
+    rs = np.divide(avg_gain, avg_loss, out=np.zeros_like(avg_gain), where=avg_loss != 0)
+    return 100 - (100 / (1 + rs))
+
+def all_pair_statistics(prices, with_cointegration=True):
+    """Indicators for all N(N-1)/2 pairs of an `(N assets, T)` price array.
+
+    Per-asset indicators (moving averages, RSI, MACD) are computed once per
+    asset and spread statistics come from the covariance matrix, so no pair
+    is processed on its own. Returns a dict of arrays: `pairs` is `(P, 2)`
+    and every other entry is indexed like it.
+
+    `prices` may also be `(games, N, T)`, giving `(games, P)` entries; the
+    cointegration statistics are only available for a single `(N, T)` array.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    first, second = np.triu_indices(prices.shape[-2], k=1)
+
+    # Moving Averages
+    ma_short = trailing_means(prices, MA_SHORT_WINDOW)
+    ma_long = trailing_means(prices, MA_LONG_WINDOW)
+
+    # Correlation matrix (population covariance, like np.std)
+    means = prices.mean(axis=-1)
+    centered = prices - means[..., None]
+    cov = centered @ np.swapaxes(centered, -1, -2) / prices.shape[-1]
+    var = np.diagonal(cov, axis1=-2, axis2=-1)
+    std = np.sqrt(var)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / (std[..., :, None] * std[..., None, :])
+
+    # Z-Score of the spread: var(x - y) = var(x) + var(y) - 2 cov(x, y)
+    spread_var = var[..., first] + var[..., second] - 2 * cov[..., first, second]
+    std_spread = np.sqrt(np.maximum(spread_var, 0))
+    last_spread = prices[..., first, -1] - prices[..., second, -1]
+    mean_spread = means[..., first] - means[..., second]
+    z_score = np.divide(last_spread - mean_spread, std_spread,
+                        out=np.zeros_like(std_spread), where=std_spread != 0)
+
+    # RSI
+    rsi = relative_strength(prices)
+
+    # MACD
+    macd = ewm_last(prices, MACD_FAST_SPAN) - ewm_last(prices, MACD_SLOW_SPAN)
+    signal = ewm_last(prices, MACD_SIGNAL_SPAN)
+
+    batch = {
+        'pairs': np.column_stack([first, second]),
+        'correlation_matrix': corr,
+        'ma_short_1': ma_short[..., first],
+        'ma_long_1': ma_long[..., first],
+        'ma_short_2': ma_short[..., second],
+        'ma_long_2': ma_long[..., second],
+        'correlation': corr[..., first, second],
+        'z_score': z_score,
+        'bollinger_upper': ma_long[..., first] + 2 * std_spread,
+        'bollinger_lower': ma_long[..., first] - 2 * std_spread,
+        'rsi': rsi[..., first],
+        'macd': macd[..., first],
+        'signal': signal[..., first],
+        'macd_hist': macd[..., first] - signal[..., first]
+    }
+
+    # Hedge ratio, Engle-Granger cointegration and mean reversion
+    if with_cointegration and prices.ndim == 2:
+        coint = pair_cointegration(prices)
+        for key in ('hedge_ratio', 'coint_p_value', 'half_life'):
+            batch[key] = coint[key]
+    return batch
+
+# Keys of the per-pair statistics dict shown to players
+STAT_KEYS = ('ma_short_1', 'ma_long_1', 'ma_short_2', 'ma_long_2', 'correlation', 'z_score',
+             'bollinger_upper', 'bollinger_lower', 'rsi', 'macd', 'signal', 'macd_hist',
+             'hedge_ratio', 'coint_p_value', 'half_life')
+
+def pair_stats_dict(batch, k):
+    """Rounded statistics dict of the `k`-th pair of an `all_pair_statistics` result."""
+    return {key: round(float(batch[key][k]), 2) for key in STAT_KEYS}
+
+def opportunities_table(batch, asset_names):
+    """Pairs ranked by absolute z-score, as a dict of columns for `st.dataframe`."""
+    pairs = batch['pairs']
+    order = np.argsort(-np.abs(batch['z_score']), kind='stable')
+    return {
+        'Pair': [f"{asset_names[i]} & {asset_names[j]}" for i, j in pairs[order]],
+        'Z-Score': np.round(batch['z_score'][order], 2),
+        'Correlation': np.round(batch['correlation'][order], 2),
+        'RSI': np.round(batch['rsi'][order], 2),
+        'MACD Hist': np.round(batch['macd_hist'][order], 2),
+        'Hedge Ratio': np.round(batch['hedge_ratio'][order], 2),
+        'Coint p-value': np.round(batch['coint_p_value'][order], 3),
+        'Half-Life': np.round(batch['half_life'][order], 1)
+    }
+
+# ============================
+# ====== ROUND HISTORIES =====
+# ============================
+
+def simulate_round_history(asset_prices, rng=None, num_days=HISTORY_DAYS):
+    """Simulate an `(N, num_days)` price history with realistic correlations.
+
+    A one-factor model with loadings in [sqrt(0.5), sqrt(0.95)] gives every
+    pair a correlation between 0.5 and 0.95 (high correlation for arbitrage
+    opportunities) with a guaranteed valid covariance matrix. A `(games, N)`
+    price matrix gives one independent `(games, N, num_days)` history per game.
+    """
+    rng = get_rng(rng)
+    base_prices = np.asarray(asset_prices, dtype=np.float64)
+    loadings = rng.uniform(np.sqrt(0.5), np.sqrt(0.95), size=base_prices.shape)
+    factor = rng.standard_normal(base_prices.shape[:-1] + (num_days,))
+    noise = rng.standard_normal(base_prices.shape + (num_days,))
+    std_dev = 5
+    returns = loadings[..., None] * factor[..., None, :] + np.sqrt(1 - loadings ** 2)[..., None] * noise
+    return base_prices[..., None] + std_dev * returns
+
+def calculate_statistics(asset_prices, asset_index_1, asset_index_2, rng=None):
+    """Calculate advanced statistical indicators for asset pairs."""
+    # Simulate 30-day historical prices with realistic correlations
+    rng = get_rng(rng)
+    correlation = rng.uniform(0.5, 0.95)  # High correlation for arbitrage opportunities
+    mean = [asset_prices[asset_index_1], asset_prices[asset_index_2]]
+    std_dev = [5, 5]
+    cov = [[std_dev[0]**2, correlation * std_dev[0] * std_dev[1]],
+           [correlation * std_dev[0] * std_dev[1], std_dev[1]**2]]
+    price_series = rng.multivariate_normal(mean, cov, HISTORY_DAYS).T
+
+    batch = all_pair_statistics(price_series)
+    return pair_stats_dict(batch, 0), price_series[0], price_series[1]
+
+def game_seed(game_code, game):
+    """Return the seed of a game, derived from its code for games created without one."""
+    return game.get('seed', zlib.crc32(game_code.encode()))
+
+def round_rng(seed, current_round):
+    """Independent, reproducible generator for one round of a game."""
+    return np.random.default_rng([seed, current_round])
+
+@lru_cache(maxsize=256)
+def round_batch(game_code, seed, current_round, asset_prices):
+    """Simulated history and all-pair statistics of a round.
+
+    The history is drawn from a generator seeded by the game and round, so
+    the numbers are the same on every rerun and in every session. Results are
+    memoized per `(game_code, round)`; `asset_prices` must be a tuple. The
+    returned arrays are shared between callers and must not be modified.
+    """
+    history = simulate_round_history(asset_prices, round_rng(seed, current_round))
+    return history, all_pair_statistics(history)
+
+@lru_cache(maxsize=256)
+def round_statistics(game_code, seed, current_round, asset_prices):
+    """Statistics for every asset pair of a round, keyed by `(i, j)`."""
+    history, batch = round_batch(game_code, seed, current_round, asset_prices)
+    return {
+        (int(i), int(j)): (pair_stats_dict(batch, k), history[i], history[j])
+        for k, (i, j) in enumerate(batch['pairs'])
+    }
+
+def game_round_key(game_code, game):
+    """Memoization key of the current round of a game."""
+    return game_code, game_seed(game_code, game), game['current_round'], tuple(game['asset_initial_prices'])
+
+def game_round_statistics(game_code, game):
+    """Statistics for every asset pair in the current round of a game."""
+    return round_statistics(*game_round_key(game_code, game))
+
+_history_cointegration_cache = {}
+
+def game_history_cointegration(game_code, game):
+    """Hedge ratios, rolling and Kalman ones included, and cointegration tests on the real `asset_price_history`.
+
+    Memoized per `(game_code, round)`, since the history grows once per round.
+    """
+    history = game['asset_price_history'].values.T  # (assets, rounds) view, no copy
+    key = game_round_key(game_code, game) + (history.shape[1],)
+    result = _history_cointegration_cache.get(key)
+    if result is None:
+        if len(_history_cointegration_cache) >= 256:
+            _history_cointegration_cache.clear()
+        result = _history_cointegration_cache[key] = pair_cointegration(history, time_varying=True)
+    return result
+
+def game_round_opportunities(game_code, game):
+    """Pairs of the current round ranked by absolute z-score."""
+    _, batch = round_batch(*game_round_key(game_code, game))
+    return opportunities_table(batch, game['assets'])
+
+# ============================
+# == INCREMENTAL INDICATORS ==
+# ============================
+
+# Prices kept per asset: enough for the long moving average and the RSI's price changes
+RECENT_ROWS = max(MA_SHORT_WINDOW, MA_LONG_WINDOW, RSI_WINDOW + 1)
+
+# EMA smoothing factors of the fast, slow and signal lines
+EMA_ALPHAS = 2 / (np.array([MACD_FAST_SPAN, MACD_SLOW_SPAN, MACD_SIGNAL_SPAN]) + 1)
+
+
+class GameIndicators:
+    """Incremental indicators for every asset and asset pair of a game's price history.
+
+    The state is a handful of NumPy arrays, updated in O(assets + pairs) per
+    round: the last `RECENT_ROWS` prices of every asset (for the moving
+    averages, the RSI and the pairs' rolling spread window), the fast, slow
+    and signal EMAs of every asset, and the running mean and sum of squared
+    deviations (Welford) of every pair's spread over the whole history. It
+    serializes to one flat float64 buffer with `to_bytes`.
+    """
+
+    def __init__(self, num_assets):
+        self.num_assets = num_assets
+        self.pairs = np.stack(np.triu_indices(num_assets, k=1), axis=1)  # Same order as `asset_pairs`
+        self.count = 0  # Rounds seen
+        self.recent = np.zeros((RECENT_ROWS, num_assets))  # Oldest first; the last min(count, RECENT_ROWS) rows are valid
+        self.ema = np.zeros((3, num_assets))  # Fast, slow and signal EMAs
+        self.spread_mean = np.zeros(len(self.pairs))
+        self.spread_m2 = np.zeros(len(self.pairs))
+
+    def append(self, prices):
+        """Update every indicator with one new round of prices."""
+        prices = np.asarray(prices, dtype=np.float64)
+        self.recent[:-1] = self.recent[1:]
+        self.recent[-1] = prices
+        if self.count == 0:
+            self.ema[:] = prices  # The `adjust=False` EMA is seeded with the first value
+        else:
+            self.ema += EMA_ALPHAS[:, None] * (prices - self.ema)
+        self.count += 1
+        spread = prices[self.pairs[:, 0]] - prices[self.pairs[:, 1]]
+        delta = spread - self.spread_mean
+        self.spread_mean += delta / self.count
+        self.spread_m2 += delta * (spread - self.spread_mean)
+
+    def _window(self, size):
+        """The last `size` valid rows of recent prices."""
+        return self.recent[RECENT_ROWS - min(size, self.count):]
+
+    def asset_snapshot(self, asset):
+        """Current moving averages, RSI and MACD of one asset."""
+        if self.count == 0:
+            return {'ma_short': 0.0, 'ma_long': 0.0, 'rsi': 0.0, 'macd': 0.0, 'signal': 0.0, 'macd_hist': 0.0}
+        changes = np.diff(self._window(RSI_WINDOW + 1)[:, asset])
+        avg_gain = np.clip(changes, 0, None).mean() if len(changes) else 0.0
+        avg_loss = np.clip(-changes, 0, None).mean() if len(changes) else 0.0
+        rs = avg_gain / avg_loss if avg_loss != 0 else 0
+        fast, slow, signal = self.ema[:, asset]
+        return {
+            'ma_short': float(self._window(MA_SHORT_WINDOW)[:, asset].mean()),
+            'ma_long': float(self._window(MA_LONG_WINDOW)[:, asset].mean()),
+            'rsi': float(100 - (100 / (1 + rs))),
+            'macd': float(fast - slow),
+            'signal': float(signal),
+            'macd_hist': float(fast - slow - signal)
+        }
+
+    def pair_snapshot(self, i, j):
+        """Spread z-score over the full history and over the last `MA_LONG_WINDOW` rounds of pair `(i, j)`."""
+        if self.count == 0:
+            return {'z_score': 0.0, 'rolling_z_score': 0.0, 'std_spread': 0.0}
+        k = pair_code(self.num_assets, i, j)
+        last_spread = self.recent[-1, i] - self.recent[-1, j]
+        std = np.sqrt(max(self.spread_m2[k], 0.0) / self.count)
+        window = self._window(MA_LONG_WINDOW)
+        window = window[:, i] - window[:, j]
+        rolling_std = window.std()
+        return {
+            'z_score': float((last_spread - self.spread_mean[k]) / std) if std != 0 else 0.0,
+            'rolling_z_score': float((last_spread - window.mean()) / rolling_std) if rolling_std != 0 else 0.0,
+            'std_spread': float(std)
+        }
+
+    @classmethod
+    def from_history(cls, assets, asset_price_history):
+        """Build the indicators by replaying a game's `asset_price_history` (a `PriceHistory`) once."""
+        indicators = cls(len(assets))
+        for prices in asset_price_history.values:
+            indicators.append(prices)
+        return indicators
+
+    def to_bytes(self):
+        """Serialize the state as one flat float64 buffer."""
+        return np.concatenate([
+            [self.count], self.recent.ravel(), self.ema.ravel(), self.spread_mean, self.spread_m2
+        ]).tobytes()
+
+    @classmethod
+    def from_bytes(cls, num_assets, data):
+        """Restore the state of a game with `num_assets` assets from `to_bytes` output."""
+        indicators = cls(num_assets)
+        values = np.frombuffer(data, dtype=np.float64)
+        indicators.count = int(values[0])
+        offset = 1
+        for name in ('recent', 'ema', 'spread_mean', 'spread_m2'):
+            array = getattr(indicators, name)
+            array[...] = values[offset:offset + array.size].reshape(array.shape)
+            offset += array.size
+        return indicators
+
+
+def load_indicators(game):
+    """A game's incremental indicators, restored from its state or rebuilt from its history.
+
+    The caller gets its own instance and is free to update it.
+    """
+    state = game.get('indicator_state')
+    if isinstance(state, bytes):
+        return GameIndicators.from_bytes(len(game['assets']), state)
+    return GameIndicators.from_history(game['assets'], game['asset_price_history'])
+
+_indicators_cache = {}
+
+def game_indicators(game_code, game):
+    """Incremental indicators of a game's price history, memoized per `(game_code, round)`.
+
+    The instance is shared between callers, who must not update it.
+    """
+    key = game_round_key(game_code, game) + (len(game['asset_price_history']),)
+    indicators = _indicators_cache.get(key)
+    if indicators is None:
+        if len(_indicators_cache) >= 256:
+            _indicators_cache.clear()
+        indicators = _indicators_cache[key] = load_indicators(game)
+    return indicators
+
+# ============================
+# ====== CORRELATION =========
+# ============================
+
+class RunningCovariance:
+    """Asset covariance from running sums of x and x xᵀ over price rows.
+
+    Adding or removing a row costs O(N²) for N assets, whatever the length
+    of the history. Prices are shifted by the first row before they are
+    summed, which keeps the sums small and the variances accurate.
+    """
+
+    def __init__(self, num_assets):
+        self.count = 0
+        self.shift = None
+        self.sum = np.zeros(num_assets)
+        self.outer = np.zeros((num_assets, num_assets))
+
+    def append(self, rows):
+        """Add one row or a `(rows, assets)` block of rows."""
+        rows = np.atleast_2d(rows)
+        if self.shift is None:
+            self.shift = rows[0].copy()
+        rows = rows - self.shift
+        self.count += len(rows)
+        self.sum += rows.sum(axis=0)
+        self.outer += rows.T @ rows
+
+    def remove(self, rows):
+        """Remove rows added earlier, e.g. the ones leaving a rolling window."""
+        rows = np.atleast_2d(rows) - self.shift
+        self.count -= len(rows)
+        self.sum -= rows.sum(axis=0)
+        self.outer -= rows.T @ rows
+
+    def correlation(self):
+        """Pearson correlation matrix; NaN where an asset's price did not move."""
+        if self.count < 2:
+            return np.full(self.outer.shape, np.nan)
+        mean = self.sum / self.count
+        cov = self.outer / self.count - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        corr[~np.isfinite(corr)] = np.nan
+        return np.clip(corr, -1, 1)
+
+
+_correlation_states = {}  # (game_code, window) -> (rows consumed, RunningCovariance)
+_correlation_cache = {}
+_correlation_lock = threading.Lock()
+
+def game_correlation(game_code, game, window=None):
+    """Correlation matrix of a game's assets over its price history, or its last `window` rounds.
+
+    The running sums of each game are kept between calls and fed only the
+    rows added since, so a new round costs O(N²) rather than O(T·N²).
+    Results are memoized per `(game_code, rounds, window)` and shared
+    between callers, who must not modify them.
+    """
+    values = game['asset_price_history'].values
+    key = (game_code, len(values), window)
+    with _correlation_lock:
+        result = _correlation_cache.get(key)
+        if result is not None:
+            return result
+        consumed, state = _correlation_states.get((game_code, window), (0, None))
+        if state is None or consumed > len(values):
+            consumed, state = 0, RunningCovariance(values.shape[1])
+        state.append(values[consumed:])
+        if window is not None:
+            # Drop the rows that left the window since the last call
+            state.remove(values[max(consumed - window, 0):max(len(values) - window, 0)])
+        _correlation_states[(game_code, window)] = (len(values), state)
+        if len(_correlation_cache) >= 256:
+            _correlation_cache.clear()
+        result = _correlation_cache[key] = state.correlation()
+        result.flags.writeable = False
+        return result
+
+def top_correlated_pairs(correlation_matrix, k=20):
+    """The `k` asset pairs `(i, j, correlation)` with the largest |correlation|, strongest first.
+
+    A sparse alternative to plotting the full matrix of a large universe.
+    """
+    i, j = np.triu_indices(len(correlation_matrix), k=1)
+    strength = np.nan_to_num(np.abs(correlation_matrix[i, j]), nan=-1.0)
+    k = min(k, len(strength))
+    if k == 0:
+        return []
+    top = np.argpartition(-strength, k - 1)[:k]
+    top = top[np.argsort(-strength[top])]
+    return [(int(i[n]), int(j[n]), float(correlation_matrix[i[n], j[n]])) for n in top]
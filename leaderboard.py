@@ -0,0 +1,81 @@
+# leaderboard.py
+
+from bisect import bisect_left, insort
+
+# ============================
+# ====== LEADERBOARD =========
+# ============================
+
+class Leaderboard:
+    """Players ordered by final score (score - penalties), then capital.
+
+    Entries are kept in a list sorted on `(-final score, -capital, player)`,
+    so updating one player is a binary search plus a list insert instead of a
+    full rebuild and sort, and top-k and rank queries need no DataFrame.
+    `version` records the game version the board reflects.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self._keys = []  # Sorted (-final score, -capital, player)
+        self._rows = {}  # player -> (key, row)
+
+    @classmethod
+    def from_players(cls, players, version=None):
+        """Build a board from a game's players dict."""
+        board = cls(version)
+        for player_name, player in players.items():
+            key, row = cls._entry(player_name, player)
+            board._rows[player_name] = (key, row)
+            board._keys.append(key)
+        board._keys.sort()
+        return board
+
+    @staticmethod
+    def _entry(player_name, player):
+        """Sort key and display row of a player."""
+        final_score = player['score'] - player['penalties']
+        capital = round(player['capital'], 2)
+        row = {
+            'Player': player_name,
+            'Score': final_score,
+            'Capital': capital,
+            'Penalties': player['penalties'],
+            'Decisions Made': len(player['decisions'])
+        }
+        return (-final_score, -capital, player_name), row
+
+    def update(self, player_name, player):
+        """Insert a player or move them to their new position."""
+        previous = self._rows.get(player_name)
+        if previous is not None:
+            del self._keys[bisect_left(self._keys, previous[0])]
+        key, row = self._entry(player_name, player)
+        insort(self._keys, key)
+        self._rows[player_name] = (key, row)
+
+    def remove(self, player_name):
+        """Remove a player from the board."""
+        key, _ = self._rows.pop(player_name)
+        del self._keys[bisect_left(self._keys, key)]
+
+    def top(self, k):
+        """Rows of the `k` best players."""
+        return [self._rows[key[2]][1] for key in self._keys[:k]]
+
+    def rank(self, player_name):
+        """1-based rank of a player, or None if they are not on the board."""
+        entry = self._rows.get(player_name)
+        if entry is None:
+            return None
+        return bisect_left(self._keys, entry[0]) + 1
+
+    def records(self):
+        """All rows in ranking order."""
+        return self.top(len(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, player_name):
+        return player_name in self._rows
@@ -0,0 +1,93 @@
+# market.py
+
+import numpy as np
+
+# ============================
+# ====== MARKET REGIMES ======
+# ============================
+
+# Market conditions, indexed by their integer regime code
+MARKET_CONDITIONS = ['Stable Market', 'Volatile Market', 'Bull Market', 'Bear Market']
+MARKET_PROBABILITIES = [0.3, 0.4, 0.2, 0.1]
+
+# Bounds of the uniform per-round price change for each regime code
+CHANGE_BOUNDS = np.array([
+    [-0.03, 0.03],   # Stable Market
+    [-0.2, 0.2],     # Volatile Market
+    [0.05, 0.15],    # Bull Market
+    [-0.15, -0.05],  # Bear Market
+])
+
+# ============================
+# ====== BATCHED ENGINE ======
+# ============================
+
+def get_rng(rng=None):
+    """Return `rng` if it is a Generator, otherwise a Generator seeded with it."""
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+def regime_codes(conditions):
+    """Convert market condition names to regime codes."""
+    return np.array([MARKET_CONDITIONS.index(condition) for condition in conditions], dtype=np.int8)
+
+def regime_names(codes):
+    """Convert regime codes to market condition names."""
+    return [MARKET_CONDITIONS[code] for code in np.asarray(codes).ravel()]
+
+def generate_regimes(num_rounds, rng=None, num_games=None):
+    """Draw regime codes for `num_rounds` rounds, or a `(num_games, num_rounds)` array."""
+    shape = num_rounds if num_games is None else (num_games, num_rounds)
+    return get_rng(rng).choice(len(MARKET_CONDITIONS), size=shape, p=MARKET_PROBABILITIES).astype(np.int8)
+
+def draw_changes(regimes, num_assets, rng=None):
+    """Draw per-asset price changes for an array of regime codes.
+
+    Returns an array of shape `regimes.shape + (num_assets,)`.
+    """
+    regimes = np.asarray(regimes)
+    low = CHANGE_BOUNDS[regimes, 0][..., None]
+    high = CHANGE_BOUNDS[regimes, 1][..., None]
+    return low + (high - low) * get_rng(rng).random(regimes.shape + (num_assets,))
+
+def step_markets(prices, regimes, rng=None, decimals=2):
+    """Advance a `(games, assets)` price matrix by one round in a single call.
+
+    `regimes` holds one regime code per game (or a single code for all games).
+    Prices are rounded to `decimals` like the in-game prices; pass None to skip.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    regimes = np.broadcast_to(np.asarray(regimes), prices.shape[:-1])
+    new_prices = prices * (1 + draw_changes(regimes, prices.shape[-1], rng))
+    return new_prices if decimals is None else np.round(new_prices, decimals)
+
+def simulate_price_path(initial_prices, regimes, rng=None, decimals=2):
+    """Generate a full price path up front.
+
+    `initial_prices` is `(assets,)` or `(games, assets)` and `regimes` is
+    `(rounds,)` or `(games, rounds)`; either one is broadcast across games,
+    and every game draws its own path. Returns `(rounds + 1, assets)` or
+    `(games, rounds + 1, assets)` with the initial prices as the first row.
+    Prices compound without intermediate rounding, then get rounded once.
+    """
+    initial_prices = np.asarray(initial_prices, dtype=np.float64)
+    regimes = np.asarray(regimes)
+    games = np.broadcast_shapes(initial_prices.shape[:-1], regimes.shape[:-1])
+    initial_prices = np.broadcast_to(initial_prices, games + initial_prices.shape[-1:])
+    regimes = np.broadcast_to(regimes, games + regimes.shape[-1:])
+    growth = np.cumprod(1 + draw_changes(regimes, initial_prices.shape[-1], rng), axis=-2)
+    path = np.concatenate([initial_prices[..., None, :], initial_prices[..., None, :] * growth], axis=-2)
+    return path if decimals is None else np.round(path, decimals)
+
+# ============================
+# ====== SINGLE GAME =========
+# ============================
+
+def generate_market_conditions(num_rounds, rng=None):
+    """Draw the market condition names of a game's rounds."""
+    return regime_names(generate_regimes(num_rounds, rng))
+
+def simulate_market(asset_prices, market_condition, rng=None):
+    """Move one game's asset prices by one round under the named market condition."""
+    return step_markets([asset_prices], regime_codes([market_condition]), rng)[0].tolist()
@@ -0,0 +1,257 @@
+# metrics.py
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import cProfile
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import numpy as np
+
+# ============================
+# ====== LATENCY STATS =======
+# ============================
+
+class LatencyStats:
+    """Running latency statistics, in seconds.
+
+    Count, total and maximum cover every sample; percentiles are taken over
+    the latest `window` samples only, so memory stays bounded.
+    """
+
+    def __init__(self, window=1000):
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add one sample."""
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def summary(self):
+        """Count, mean, max and recent p50/p95/p99 as a dict."""
+        with self._lock:
+            recent = np.array(self._recent)
+            summary = {'count': self.count, 'mean': self.total / max(self.count, 1), 'max': self.max}
+        for q in (50, 95, 99):
+            summary[f'p{q}'] = float(np.percentile(recent, q)) if len(recent) else 0.0
+        return summary
+
+# ============================
+# ====== REGISTRY ============
+# ============================
+
+class MetricsRegistry:
+    """Process-wide timing spans and labelled counters, exported in the Prometheus text format.
+
+    Spans record durations into a `LatencyStats` per name; counters are
+    keyed by name and labels, e.g. `inc('decisions_total', game='GROUPA')`.
+    Collectors are callables returning extra `(name, labels, value)` samples
+    that are computed when the metrics are rendered; names ending in
+    `_total` are exported as counters, others as gauges.
+    """
+
+    def __init__(self, prefix='arbitrage'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._spans = {}  # name -> LatencyStats
+        self._counters = defaultdict(float)  # (name, sorted label items) -> value
+        self._collectors = []
+
+    def observe(self, name, seconds):
+        """Record one duration of span `name`."""
+        stats = self._spans.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._spans.setdefault(name, LatencyStats())
+        stats.record(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Time the block as span `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator timing every call of a function as span `name`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def span_stats(self, name):
+        """`LatencyStats` of span `name`, created empty if it has not run yet."""
+        with self._lock:
+            return self._spans.setdefault(name, LatencyStats())
+
+    def inc(self, name, value=1, **labels):
+        """Add `value` to the counter `name` with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def add_collector(self, collector):
+        """Register a callable returning `(name, labels dict, value)` samples at render time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            spans = dict(self._spans)
+            counters = dict(self._counters)
+            collectors = list(self._collectors)
+
+        lines = []
+        if spans:
+            name = f'{self.prefix}_span_seconds'
+            lines.append(f'# TYPE {name} summary')
+            for span, stats in sorted(spans.items()):
+                summary = stats.summary()
+                for q in (50, 95, 99):
+                    lines.append(f'{name}{format_labels({"span": span, "quantile": q / 100})} {summary[f"p{q}"]}')
+                lines.append(f'{name}_sum{format_labels({"span": span})} {stats.total}')
+                lines.append(f'{name}_count{format_labels({"span": span})} {stats.count}')
+
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {self.prefix}_{name} counter')
+                typed.add(name)
+            lines.append(f'{self.prefix}_{name}{format_labels(dict(labels))} {value}')
+
+        for collector in collectors:
+            for name, labels, value in collector():
+                if name not in typed:
+                    lines.append(f"# TYPE {self.prefix}_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+                    typed.add(name)
+                lines.append(f'{self.prefix}_{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    """Prometheus label set such as `{game="GROUPA"}`, or an empty string."""
+    if not labels:
+        return ''
+    escaped = {
+        key: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for key, value in labels.items()
+    }
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped.items()) + '}'
+
+
+# Registry shared by the app, the engine and the store
+REGISTRY = MetricsRegistry()
+span = REGISTRY.span
+timed = REGISTRY.timed
+inc = REGISTRY.inc
+
+# ============================
+# ====== ENDPOINT ============
+# ============================
+
+def serve_metrics(port, host='127.0.0.1', registry=REGISTRY):
+    """Serve `registry` at http://host:port/metrics from a daemon thread; returns the server."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a log line each
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-endpoint', daemon=True).start()
+    return server
+
+# ============================
+# ====== PROFILING ===========
+# ============================
+
+class RerunProfiler:
+    """Opt-in profile of a single script run with cProfile or pyinstrument.
+
+    `start` begins the capture unless one already happened in this process,
+    and `stop`, called from the same run, writes it to `path`: pstats data for cProfile (open with
+    `python -m pstats` or snakeviz), an HTML report for pyinstrument
+    (requires pyinstrument).
+
+    A run ended early by st.rerun or st.stop never reaches `stop`; the next
+    `start` discards such a capture, recognized by its thread having ended
+    or starting another run, and captures the new run instead.
+    """
+
+    def __init__(self, kind, path):
+        if kind not in ('cprofile', 'pyinstrument'):
+            raise ValueError(f"Unknown profiler '{kind}'; expected 'cprofile' or 'pyinstrument'")
+        self.kind = kind
+        self.path = path
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._thread = None  # Streamlit runs each script run in one thread, and reruns in the same one
+        self.done = False
+
+    def start(self):
+        """Start profiling the calling run; returns False if a capture is running or done."""
+        with self._lock:
+            if self._profiler is not None and (self._thread is threading.current_thread()
+                                               or not self._thread.is_alive()):
+                self._discard()
+            if self.done or self._profiler is not None:
+                return False
+            self._thread = threading.current_thread()
+            if self.kind == 'cprofile':
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+            else:
+                import pyinstrument
+                self._profiler = pyinstrument.Profiler()
+                self._profiler.start()
+            return True
+
+    def stop(self):
+        """Stop the capture and write it to `path`."""
+        with self._lock:
+            if self._profiler is None or self.done or self._thread is not threading.current_thread():
+                return
+            if self.kind == 'cprofile':
+                self._profiler.disable()
+                self._profiler.dump_stats(self.path)
+            else:
+                self._profiler.stop()
+                with open(self.path, 'w') as f:
+                    f.write(self._profiler.output_html())
+            self.done = True
+
+    def _discard(self):
+        """Drop the capture of a run that ended without `stop`."""
+        if self.kind == 'cprofile':
+            self._profiler.disable()
+        elif self._thread is threading.current_thread():
+            self._profiler.stop()
+        # A pyinstrument capture of an ended thread stopped sampling with it
+        self._profiler = None
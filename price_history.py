@@ -0,0 +1,125 @@
+# price_history.py
+
+import copy
+import os
+import threading
+
+import numpy as np
+
+# ============================
+# ====== CONFIGURATION =======
+# ============================
+
+INITIAL_CAPACITY = 64  # Rows preallocated for a new game; the file doubles in size when full
+
+# ============================
+# ====== PRICE FILES =========
+# ============================
+
+class PriceHistoryFile:
+    """Preallocated, memory-mapped float64 `(rows, assets)` price file of one game.
+
+    Rows are only ever appended, so a view of the first `length` rows never
+    changes once it is taken and can be shared by sessions and threads
+    without copying. The number of valid rows is not kept in the file: it is
+    committed with the game in the database after the rows are written, and
+    rows beyond it are scratch space.
+    """
+
+    def __init__(self, path, num_assets):
+        self.path = path
+        self.num_assets = num_assets
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.truncate(INITIAL_CAPACITY * self._row_bytes)
+        self._map()
+
+    @property
+    def _row_bytes(self):
+        return self.num_assets * np.dtype(np.float64).itemsize
+
+    @property
+    def capacity(self):
+        """Number of rows the file can hold before it has to grow."""
+        return self._rows.shape[0]
+
+    def _map(self):
+        """(Re)map the whole file, e.g. after it was grown by another process."""
+        capacity = os.path.getsize(self.path) // self._row_bytes
+        self._rows = np.memmap(self.path, dtype=np.float64, mode='r+', shape=(capacity, self.num_assets))
+
+    def view(self, length):
+        """Read-only, zero-copy array of the first `length` rows."""
+        with self._lock:
+            if length > self.capacity:
+                self._map()
+            view = self._rows[:length].view(np.ndarray)
+        view.flags.writeable = False
+        return view
+
+    def write(self, start, rows):
+        """Write rows from row `start` on, growing the file if needed.
+
+        Callers must hold the game's database write lock, so that a single
+        writer appends at a time.
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.num_assets)
+        end = start + len(rows)
+        with self._lock:
+            if end > self.capacity:
+                self._map()
+            if end > self.capacity:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(max(2 * self.capacity, end) * self._row_bytes)
+                self._map()
+            self._rows[start:end] = rows
+
+# ============================
+# ====== PRICE SNAPSHOTS =====
+# ============================
+
+class PriceHistory:
+    """A game's price rows: a zero-copy snapshot of its file plus rows appended in memory.
+
+    `values` is a `(rounds, assets)` float64 array. As long as nothing was
+    appended since the game was loaded, it is the read-only file view itself.
+    Copies of a snapshot share that view, so loading a game never copies its
+    price history.
+    """
+
+    def __init__(self, assets, committed=None, pending=()):
+        self.assets = list(assets)
+        self._committed = np.empty((0, len(self.assets))) if committed is None else committed
+        self._pending = [[float(price) for price in row] for row in pending]
+
+    @classmethod
+    def from_dict(cls, assets, asset_price_history):
+        """Build a snapshot from the legacy dict of per-asset price lists."""
+        return cls(assets, pending=zip(*(asset_price_history[asset] for asset in assets)))
+
+    @property
+    def values(self):
+        """All rows as a `(rounds, assets)` array."""
+        if not self._pending:
+            return self._committed
+        return np.vstack([self._committed, np.array(self._pending, dtype=np.float64)])
+
+    def append(self, prices):
+        """Add one round of prices in memory; it reaches the file when the game is saved."""
+        self._pending.append([float(price) for price in prices])
+
+    def column(self, asset):
+        """Price series of one asset."""
+        return self.values[:, self.assets.index(asset)]
+
+    def to_dict(self):
+        """Legacy dict of per-asset price lists."""
+        values = self.values
+        return {asset: values[:, i].tolist() for i, asset in enumerate(self.assets)}
+
+    def __len__(self):
+        return len(self._committed) + len(self._pending)
+
+    def __deepcopy__(self, memo):
+        return PriceHistory(self.assets, self._committed, copy.deepcopy(self._pending, memo))
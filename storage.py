@@ -0,0 +1,784 @@
+# storage.py
+
+from collections import defaultdict
+from contextlib import contextmanager
+from copy import deepcopy
+from datetime import datetime, timezone
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+from decisions import DecisionLog
+from metrics import inc
+from price_history import PriceHistory, PriceHistoryFile
+
+# ============================
+# ====== CONNECTIONS =========
+# ============================
+
+MIGRATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore:
+    """Base class holding a pool of WAL-mode SQLite connections shared by all threads.
+
+    Streamlit runs every script run on a new thread, so connections are not
+    tied to threads: each use borrows an idle connection from the pool and
+    returns it afterwards, and a new one is only opened when all are busy.
+
+    The `migrations` table records one-time imports, so that they are not
+    repeated on every start.
+    """
+
+    schema = ''
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = []  # Idle connections
+        self._pool_lock = threading.Lock()
+        with self._connection() as conn, conn:
+            conn.executescript(MIGRATIONS_SCHEMA + self.schema)
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a connection for the duration of the block."""
+        with self._pool_lock:
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        try:
+            yield conn
+        finally:
+            with self._pool_lock:
+                self._pool.append(conn)
+
+    def _migrated(self, name):
+        """Check whether the one-time migration `name` has been applied."""
+        with self._connection() as conn:
+            row = conn.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _mark_migrated(conn, name):
+        """Record migration `name` as applied, inside the caller's transaction."""
+        conn.execute(
+            'INSERT OR IGNORE INTO migrations (name, applied_at) VALUES (?, ?)',
+            (name, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+        )
+
+# ============================
+# ====== GAME LOCKS ==========
+# ============================
+
+class VersionConflict(Exception):
+    """A game was changed by another writer since the version a write was based on."""
+
+
+class GameLocks:
+    """One lock per `game_code`, with lock wait times recorded per game.
+
+    Writers of the same game in this process queue on its lock, while writes
+    to other games proceed in parallel. Writers in other processes are caught
+    by the version check of `GameStore.save_game`.
+    """
+
+    def __init__(self):
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        self._stats = defaultdict(lambda: {'acquisitions': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'conflicts': 0})
+
+    @contextmanager
+    def hold(self, game_code):
+        """Hold the lock of a game for the duration of the block."""
+        with self._guard:
+            lock = self._locks[game_code]
+        start = time.perf_counter()
+        with lock:
+            wait = time.perf_counter() - start
+            with self._guard:
+                stats = self._stats[game_code]
+                stats['acquisitions'] += 1
+                stats['wait_total'] += wait
+                stats['wait_max'] = max(stats['wait_max'], wait)
+            yield
+
+    def record_conflict(self, game_code):
+        """Count a write to a game that had to be retried."""
+        with self._guard:
+            self._stats[game_code]['conflicts'] += 1
+
+    def stats(self):
+        """Per-game lock metrics: acquisitions, total/max/mean wait in seconds and retried writes."""
+        with self._guard:
+            return {
+                game_code: dict(stats, wait_mean=stats['wait_total'] / max(stats['acquisitions'], 1))
+                for game_code, stats in self._stats.items()
+            }
+
+# ============================
+# ====== GAME STATE STORE ====
+# ============================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_code TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    history_rows INTEGER NOT NULL DEFAULT 0,
+    indicators BLOB
+);
+CREATE TABLE IF NOT EXISTS players (
+    game_code TEXT NOT NULL,
+    player_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    decisions BLOB,
+    PRIMARY KEY (game_code, player_name)
+);
+CREATE TABLE IF NOT EXISTS pending_decisions (
+    game_code TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    player_name TEXT NOT NULL,
+    decision TEXT NOT NULL,
+    PRIMARY KEY (game_code, round, player_name)
+);
+"""
+
+# Keys of a game dict that are stored in their own tables, columns or files rather than in the game row
+SPLIT_KEYS = ('players', 'asset_price_history', 'indicator_state')
+
+# Migration that widened the pair codes of stored decision logs to `DECISION_DTYPE`
+DECISION_LOG_MIGRATION = 'decision_log_pair_i4'
+
+
+class GameStore(SQLiteStore):
+    """SQLite (WAL mode) storage with one row per game and per player.
+
+    Games are read one `game_code` at a time and writes only touch the rows
+    that changed, so the cost of a decision no longer grows with the history
+    of every other game.
+
+    Price histories live in one memory-mapped `PriceHistoryFile` per game,
+    in the `<path>.prices` directory. The games table holds the number of
+    committed rows, so a loaded game is a consistent zero-copy snapshot of
+    its history.
+
+    Loaded games are cached in memory, keyed by a per-game version counter
+    that every write increments. Unchanged games are served from the cache
+    without reading the database; writes from other processes are detected
+    through `PRAGMA data_version`.
+
+    Every write is a single SQLite transaction, so a crash never leaves a
+    partially written game. `save_game` can be made conditional on the
+    version a game was loaded at, turning load -> mutate -> save into a
+    compare-and-swap.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, path):
+        self._cache = {}  # game_code -> (version, game)
+        self._pending = {}  # (game_code, round) -> queued decisions by player name
+        self._cache_lock = threading.Lock()
+        self._generation = 0  # Bumped by every write made through this store and by evictions
+        self._data_versions = {}  # id(connection) -> last seen PRAGMA data_version
+        self._history_dir = f'{path}.prices'
+        self._history_files = {}  # game_code -> PriceHistoryFile
+        self._history_lock = threading.Lock()
+        os.makedirs(self._history_dir, exist_ok=True)
+        super().__init__(path)
+        with self._connection() as conn, conn:
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(games)')]
+            if 'version' not in columns:
+                # Databases created before game versioning
+                conn.execute('ALTER TABLE games ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+            if 'history_rows' not in columns:
+                conn.execute('ALTER TABLE games ADD COLUMN history_rows INTEGER NOT NULL DEFAULT 0')
+            if 'indicators' not in columns:
+                # Databases created before the binary indicator state keep it in the JSON state
+                conn.execute('ALTER TABLE games ADD COLUMN indicators BLOB')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(players)')]
+            if 'decisions' not in columns:
+                # Databases created before the columnar decision log keep decisions in the JSON state
+                conn.execute('ALTER TABLE players ADD COLUMN decisions BLOB')
+        self._migrate_price_table()
+        self._migrate_decision_logs()
+
+    def _migrate_price_table(self):
+        """Move price rounds of databases created before the price files into them.
+
+        The files are written first and the table is dropped in the same
+        transaction that records the row counts, so an interrupted migration
+        is simply repeated.
+        """
+        with self._connection() as conn:
+            legacy_table = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_history'"
+            ).fetchone()
+            if legacy_table is None:
+                return
+            with conn:
+                counts = []
+                for game_code, state in conn.execute('SELECT game_code, state FROM games').fetchall():
+                    assets = json.loads(state)['assets']
+                    rows = [json.loads(prices) for (prices,) in conn.execute(
+                        'SELECT prices FROM price_history WHERE game_code = ? ORDER BY round', (game_code,)
+                    )]
+                    self._history_file(game_code, len(assets)).write(0, np.array(rows, dtype=np.float64))
+                    counts.append((len(rows), game_code))
+                conn.executemany('UPDATE games SET history_rows = ? WHERE game_code = ?', counts)
+                conn.execute('DROP TABLE price_history')
+
+    def _migrate_decision_logs(self):
+        """Widen the pair codes of decision logs written with `LEGACY_DECISION_DTYPE`.
+
+        The logs are rewritten in the transaction that records the migration,
+        under the database write lock, so they are converted exactly once.
+        """
+        if self._migrated(DECISION_LOG_MIGRATION):
+            return
+        with self._connection() as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM migrations WHERE name = ?', (DECISION_LOG_MIGRATION,)).fetchone():
+                return
+            rows = conn.execute(
+                'SELECT game_code, player_name, decisions FROM players WHERE decisions IS NOT NULL'
+            ).fetchall()
+            conn.executemany(
+                'UPDATE players SET decisions = ? WHERE game_code = ? AND player_name = ?',
+                [(DecisionLog.from_legacy_bytes(decisions).to_bytes(), game_code, player_name)
+                 for game_code, player_name, decisions in rows]
+            )
+            conn.executemany('UPDATE games SET version = version + 1 WHERE game_code = ?',
+                             [(game_code,) for game_code in {row[0] for row in rows}])
+            self._mark_migrated(conn, DECISION_LOG_MIGRATION)
+
+    def _history_file(self, game_code, num_assets):
+        """The price file of a game, opened once per store."""
+        with self._history_lock:
+            history_file = self._history_files.get(game_code)
+            if history_file is None:
+                path = os.path.join(self._history_dir, f"{quote(game_code, safe='')}.f64")
+                history_file = self._history_files[game_code] = PriceHistoryFile(path, num_assets)
+            return history_file
+
+    def game_codes(self):
+        """List the codes of all stored games."""
+        with self._connection() as conn:
+            rows = conn.execute('SELECT game_code FROM games').fetchall()
+        return [row[0] for row in rows]
+
+    def has_game(self, game_code):
+        """Check whether a game is stored."""
+        with self._connection() as conn:
+            row = conn.execute('SELECT 1 FROM games WHERE game_code = ?', (game_code,)).fetchone()
+        return row is not None
+
+    def has_player(self, game_code, player_name):
+        """Check whether a player has joined a game."""
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM players WHERE game_code = ? AND player_name = ?', (game_code, player_name)
+            ).fetchone()
+        return row is not None
+
+    def load_game(self, game_code, copy=True):
+        """Load a single game, including its players and price history, or None.
+
+        The caller gets its own copy and is free to mutate it. With
+        `copy=False`, the cached game itself is returned, which costs nothing
+        however many players it has; it is shared with every other reader
+        and must not be modified.
+        """
+        cached = self._get(game_code)
+        if cached is None:
+            return None
+        return deepcopy(cached[1]) if copy else cached[1]
+
+    def load_game_versioned(self, game_code):
+        """Load a game together with its version as `(version, game)`, or None.
+
+        Pass the version back to `save_game` as `expected_version` to detect
+        concurrent writes.
+        """
+        cached = self._get(game_code)
+        return None if cached is None else (cached[0], deepcopy(cached[1]))
+
+    def version(self, game_code):
+        """Current version of a game, or None if it does not exist."""
+        cached = self._get(game_code)
+        return None if cached is None else cached[0]
+
+    def round_info(self, game_code):
+        """`(current_round, num_rounds)` of a game without copying it, or None."""
+        cached = self._get(game_code)
+        return None if cached is None else (cached[1]['current_round'], cached[1]['num_rounds'])
+
+    def _get(self, game_code):
+        """Cached `(version, game)` of a game, read from the database if needed."""
+        self._sync_versions()
+        with self._cache_lock:
+            cached = self._cache.get(game_code)
+            generation = self._generation
+        if cached is None:
+            cached = self._read_game(game_code)
+            if cached is None:
+                return None
+            with self._cache_lock:
+                # Skip caching if a write happened while the game was being read
+                if self._generation == generation:
+                    self._cache[game_code] = cached
+        return cached
+
+    def invalidate(self, game_code=None):
+        """Drop one game, or every game, and its queued decisions from the in-memory cache."""
+        with self._cache_lock:
+            self._generation += 1
+            if game_code is None:
+                self._cache.clear()
+                self._pending.clear()
+            else:
+                self._cache.pop(game_code, None)
+                for key in [key for key in self._pending if key[0] == game_code]:
+                    del self._pending[key]
+
+    def _sync_versions(self):
+        """Evict cached games and queued decisions that changed through another connection.
+
+        `PRAGMA data_version` of each pooled connection changes whenever any
+        other connection commits; its last seen value is kept per connection
+        on the store, so an unchanged database costs one PRAGMA.
+        """
+        with self._connection() as conn:
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            with self._cache_lock:
+                if self._data_versions.get(id(conn)) == data_version:
+                    return
+                self._data_versions[id(conn)] = data_version
+            versions = dict(conn.execute('SELECT game_code, version FROM games'))
+        with self._cache_lock:
+            # Readers that started before this point must not cache what they read
+            self._generation += 1
+            self._pending.clear()
+            for game_code, (version, _) in list(self._cache.items()):
+                if versions.get(game_code) != version:
+                    del self._cache[game_code]
+
+    def _read_game(self, game_code):
+        """Read a game and its version from the database in one read transaction."""
+        with self._connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                return self._read_game_rows(conn, game_code)
+            finally:
+                conn.commit()
+
+    def _read_game_rows(self, conn, game_code):
+        """Assemble a game dict from its rows; returns (version, game) or None."""
+        row = conn.execute(
+            'SELECT state, version, history_rows, indicators FROM games WHERE game_code = ?', (game_code,)
+        ).fetchone()
+        if row is None:
+            return None
+        game = json.loads(row[0])
+        # Legacy JSON indicator state is dropped; the indicators are rebuilt from the price history
+        game.pop('indicator_state', None)
+        if row[3] is not None:
+            game['indicator_state'] = row[3]
+
+        game['players'] = {}
+        for name, state, decisions in conn.execute(
+            'SELECT player_name, state, decisions FROM players WHERE game_code = ? ORDER BY rowid', (game_code,)
+        ):
+            player = json.loads(state)
+            if decisions is None:
+                player['decisions'] = DecisionLog.from_dicts(player.get('decisions', []), game['assets'])
+            else:
+                player['decisions'] = DecisionLog.from_bytes(decisions)
+            game['players'][name] = player
+
+        history_file = self._history_file(game_code, len(game['assets']))
+        game['asset_price_history'] = PriceHistory(game['assets'], history_file.view(row[2]))
+        return row[1], game
+
+    def create_game(self, game_code, game):
+        """Store a complete game dict (game row, players and price history) unless the game exists.
+
+        The check and the insert are one statement, so of several concurrent
+        creations of a game exactly one stores it. Returns True if this call did.
+        """
+        history = game.get('asset_price_history', {})
+        if not isinstance(history, PriceHistory):
+            history = PriceHistory.from_dict(game['assets'], history)
+        rows = history.values
+        state = self._dump_game(game)
+        indicators = self._indicator_blob(game)
+        player_rows = [self._player_row(game_code, name, player, game['assets'])
+                       for name, player in game.get('players', {}).items()]
+        with self._connection() as conn, conn:
+            cursor = conn.execute(
+                'INSERT INTO games (game_code, state, version, history_rows, indicators) VALUES (?, ?, 1, ?, ?) '
+                'ON CONFLICT (game_code) DO NOTHING',
+                (game_code, state, len(rows), indicators)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._history_file(game_code, len(game['assets'])).write(0, rows)
+            conn.executemany(
+                'INSERT OR REPLACE INTO players (game_code, player_name, state, decisions) VALUES (?, ?, ?, ?)',
+                player_rows
+            )
+        self.invalidate(game_code)
+        self._count_write(game_code, len(state) + len(indicators or b'') + self._rows_bytes(player_rows) + rows.nbytes)
+        return True
+
+    def submit_decision(self, game_code, current_round, player_name, decision):
+        """Queue a player's decision for a round of a game.
+
+        The decision is only stored if the game is still at `current_round`
+        and the player has not decided in it yet; returns True if it was.
+        The game row is not written, so submitting is cheap and never
+        conflicts with other players' submissions.
+        """
+        try:
+            with self._connection() as conn, conn:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO pending_decisions (game_code, round, player_name, decision) '
+                    'SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM games '
+                    "WHERE game_code = ? AND json_extract(state, '$.current_round') = ?)",
+                    (game_code, current_round, player_name, json.dumps(decision), game_code, current_round)
+                )
+        finally:
+            self._invalidate_pending(game_code, current_round)
+        return cursor.rowcount == 1
+
+    def games_with_pending_decisions(self):
+        """Codes of the games that have queued decisions for any round."""
+        with self._connection() as conn:
+            rows = conn.execute('SELECT DISTINCT game_code FROM pending_decisions').fetchall()
+        return [row[0] for row in rows]
+
+    def pending_decisions(self, game_code, current_round):
+        """Decisions queued for a round of a game, as a dict of player name -> decision.
+
+        Cached until a decision is submitted or settled through this store, or
+        the database is changed by another connection.
+        """
+        self._sync_versions()
+        key = (game_code, current_round)
+        with self._cache_lock:
+            pending = self._pending.get(key)
+            generation = self._generation
+        if pending is None:
+            with self._connection() as conn:
+                rows = conn.execute(
+                    'SELECT player_name, decision FROM pending_decisions WHERE game_code = ? AND round = ? '
+                    'ORDER BY rowid', (game_code, current_round)
+                ).fetchall()
+            pending = {player_name: json.loads(decision) for player_name, decision in rows}
+            with self._cache_lock:
+                if self._generation == generation:
+                    self._pending[key] = pending
+        return dict(pending)
+
+    def _invalidate_pending(self, game_code, current_round):
+        """Drop the cached queued decisions of a round after writing them."""
+        with self._cache_lock:
+            self._generation += 1
+            self._pending.pop((game_code, current_round), None)
+
+    def save_game(self, game_code, game, players=(), prices=None, expected_version=None, settled_round=None):
+        """Persist the game row, the listed players and optionally one new price round.
+
+        Everything happens in a single transaction; players that are not
+        listed and earlier price rounds are left untouched. Returns the new
+        version of the game.
+
+        With `expected_version`, nothing is written and `VersionConflict` is
+        raised if the stored game is no longer at that version.
+
+        With `settled_round`, the queued decisions of the listed players for
+        that round are removed in the same transaction; `VersionConflict` is
+        raised if other decisions were queued for it in the meantime.
+        """
+        new_rows = 0 if prices is None else 1
+        state = self._dump_game(game)
+        indicators = self._indicator_blob(game)
+        player_rows = [self._player_row(game_code, name, game['players'][name], game['assets']) for name in players]
+        try:
+            with self._connection() as conn, conn:
+                if expected_version is None:
+                    row = conn.execute(
+                        'UPDATE games SET state = ?, indicators = ?, version = version + 1, '
+                        'history_rows = history_rows + ? WHERE game_code = ? RETURNING version, history_rows',
+                        (state, indicators, new_rows, game_code)
+                    ).fetchone()
+                else:
+                    row = conn.execute(
+                        'UPDATE games SET state = ?, indicators = ?, version = version + 1, '
+                        'history_rows = history_rows + ? WHERE game_code = ? AND version = ? '
+                        'RETURNING version, history_rows',
+                        (state, indicators, new_rows, game_code, expected_version)
+                    ).fetchone()
+                    if row is None:
+                        raise VersionConflict(f"Game '{game_code}' changed since version {expected_version}")
+                version, history_rows = row
+                conn.executemany(
+                    'INSERT OR REPLACE INTO players (game_code, player_name, state, decisions) VALUES (?, ?, ?, ?)',
+                    player_rows
+                )
+                if prices is not None:
+                    # Written under the database write lock; the row counts once the transaction commits
+                    self._history_file(game_code, len(game['assets'])).write(history_rows - 1, prices)
+                if settled_round is not None:
+                    conn.executemany(
+                        'DELETE FROM pending_decisions WHERE game_code = ? AND round = ? AND player_name = ?',
+                        [(game_code, settled_round, player_name) for player_name in players]
+                    )
+                    (unsettled,) = conn.execute(
+                        'SELECT COUNT(*) FROM pending_decisions WHERE game_code = ? AND round = ?',
+                        (game_code, settled_round)
+                    ).fetchone()
+                    if unsettled:
+                        raise VersionConflict(f"Game '{game_code}' got new decisions for round {settled_round}")
+        finally:
+            self.invalidate(game_code)
+        self._count_write(game_code, len(state) + len(indicators or b'') + self._rows_bytes(player_rows)
+                          + 8 * len(game['assets']) * new_rows)
+        return version
+
+    def save_player(self, game_code, player_name, player):
+        """Insert or replace a single player's state; returns the new version of the game."""
+        player_row = self._player_row(game_code, player_name, player)
+        with self._connection() as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO players (game_code, player_name, state, decisions) VALUES (?, ?, ?, ?)',
+                player_row
+            )
+            (version,) = conn.execute(
+                'UPDATE games SET version = version + 1 WHERE game_code = ? RETURNING version', (game_code,)
+            ).fetchone()
+        self.invalidate(game_code)
+        self._count_write(game_code, self._rows_bytes([player_row]))
+        return version
+
+    @staticmethod
+    def _count_write(game_code, num_bytes):
+        """Count a committed write of a game and the bytes of state it wrote."""
+        inc('store_writes_total', game=game_code)
+        inc('store_bytes_written_total', num_bytes, game=game_code)
+
+    @staticmethod
+    def _rows_bytes(player_rows):
+        """Size of the JSON state and decision log of player rows."""
+        return sum(len(state) + len(decisions) for _, _, state, decisions in player_rows)
+
+    def migrate_from_json(self, path):
+        """Import games from a legacy game_states.json that are not stored yet.
+
+        The import runs once per database: it is recorded in the migrations
+        table and later calls return without reading the file. An interrupted
+        import is repeated, skipping the games it already stored. Returns the
+        list of imported game codes.
+        """
+        migration = f'game_states_json:{os.path.abspath(path)}'
+        if self._migrated(migration):
+            return []
+        try:
+            with open(path, 'r') as f:
+                game_states = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+        imported = []
+        for game_code, game in game_states.items():
+            if self.create_game(game_code, game):
+                imported.append(game_code)
+        with self._connection() as conn, conn:
+            self._mark_migrated(conn, migration)
+        return imported
+
+    @staticmethod
+    def _player_row(game_code, player_name, player, assets=None):
+        """Players table row: JSON state without the decisions, plus the decision log bytes.
+
+        Legacy lists of decision dicts are converted, which needs the game's `assets`.
+        """
+        decisions = player.get('decisions', [])
+        if not isinstance(decisions, DecisionLog):
+            decisions = DecisionLog.from_dicts(decisions, assets)
+        state = json.dumps({key: value for key, value in player.items() if key != 'decisions'})
+        return game_code, player_name, state, decisions.to_bytes()
+
+    @staticmethod
+    def _indicator_blob(game):
+        """Binary indicator state of a game for the indicators column, or None (legacy JSON state is dropped)."""
+        state = game.get('indicator_state')
+        return state if isinstance(state, bytes) else None
+
+    @staticmethod
+    def _dump_game(game):
+        """Serialize the game row, leaving out the keys kept in their own tables."""
+        return json.dumps({key: value for key, value in game.items() if key not in SPLIT_KEYS})
+
+# ============================
+# ====== GLOBAL LEADERBOARD ==
+# ============================
+
+RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS final_results (
+    game_code TEXT NOT NULL,
+    player_name TEXT NOT NULL,
+    final_score INTEGER NOT NULL,
+    final_capital REAL NOT NULL,
+    finished_at TEXT NOT NULL,
+    PRIMARY KEY (game_code, player_name)
+);
+CREATE INDEX IF NOT EXISTS final_results_by_score
+    ON final_results (game_code, final_score DESC, final_capital DESC);
+CREATE INDEX IF NOT EXISTS final_results_by_game_date ON final_results (game_code, finished_at);
+CREATE INDEX IF NOT EXISTS final_results_by_player ON final_results (player_name, finished_at);
+CREATE INDEX IF NOT EXISTS final_results_by_date ON final_results (finished_at);
+"""
+
+# Ranking order of each eviction policy; rows past the first `retain_top` of a game are deleted
+EVICTION_ORDER = {
+    'score': 'final_score DESC, final_capital DESC, finished_at',
+    'recent': 'finished_at DESC'
+}
+
+RESULT_COLUMNS = ('game_code', 'player_name', 'final_score', 'final_capital', 'finished_at')
+
+# Databases created before the column was declared INTEGER hold scores as REAL, e.g. -45400.0
+RESULT_SELECT = ', '.join('CAST(final_score AS INTEGER)' if column == 'final_score' else column
+                          for column in RESULT_COLUMNS)
+
+class ResultStore(SQLiteStore):
+    """Final results of finished games, one row per (game, player).
+
+    Recording a result is an upsert, so repeating it (e.g. on every rerun of
+    the Game Over page) leaves a single row. Each game keeps at most
+    `retain_top` rows, ranked by `eviction` ('score' keeps the best results,
+    'recent' the latest ones). All queries are served by indexes, so their
+    cost depends on the size of the answer rather than on the number of
+    results ever recorded.
+    """
+
+    schema = RESULTS_SCHEMA
+
+    def __init__(self, path, retain_top=100, eviction='score'):
+        if eviction not in EVICTION_ORDER:
+            raise ValueError(f"Unknown eviction policy '{eviction}'; expected one of {list(EVICTION_ORDER)}")
+        self.retain_top = retain_top
+        self.eviction = eviction
+        super().__init__(path)
+
+    def record(self, game_code, player_name, final_score, final_capital, finished_at=None):
+        """Insert or update a player's final result and evict rows beyond `retain_top`.
+
+        The finishing time of the first recording is kept. Returns True if
+        the result is retained.
+        """
+        finished_at = finished_at or datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._connection() as conn, conn:
+            conn.execute(
+                'INSERT INTO final_results (game_code, player_name, final_score, final_capital, finished_at) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (game_code, player_name) DO UPDATE SET '
+                'final_score = excluded.final_score, final_capital = excluded.final_capital '
+                'WHERE final_score != excluded.final_score OR final_capital != excluded.final_capital',
+                (game_code, player_name, int(final_score), round(final_capital, 2), finished_at)
+            )
+            self._evict(conn, game_code)
+        return self.has_result(game_code, player_name)
+
+    def _evict(self, conn, game_code):
+        """Delete a game's rows ranked below `retain_top`."""
+        conn.execute(
+            'DELETE FROM final_results WHERE rowid IN (SELECT rowid FROM final_results WHERE game_code = ? '
+            f'ORDER BY {EVICTION_ORDER[self.eviction]} LIMIT -1 OFFSET ?)',
+            (game_code, self.retain_top)
+        )
+
+    def has_result(self, game_code, player_name):
+        """Check whether a final result is stored for a player of a game."""
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM final_results WHERE game_code = ? AND player_name = ?', (game_code, player_name)
+            ).fetchone()
+        return row is not None
+
+    def top(self, game_code, k=10):
+        """Best `k` results of a game, by final score then capital."""
+        return self._query(
+            'WHERE game_code = ? ORDER BY final_score DESC, final_capital DESC LIMIT ?', (game_code, k)
+        )
+
+    def by_player(self, player_name, limit=100):
+        """Latest results of a player across all games."""
+        return self._query('WHERE player_name = ? ORDER BY finished_at DESC LIMIT ?', (player_name, limit))
+
+    def by_date(self, start, end, game_code=None, limit=100):
+        """Results finished in `[start, end)`, optionally for one game; dates are UTC 'YYYY-MM-DD[ HH:MM:SS]'."""
+        if game_code is None:
+            return self._query('WHERE finished_at >= ? AND finished_at < ? ORDER BY finished_at LIMIT ?',
+                               (start, end, limit))
+        return self._query(
+            'WHERE game_code = ? AND finished_at >= ? AND finished_at < ? ORDER BY finished_at LIMIT ?',
+            (game_code, start, end, limit)
+        )
+
+    def _query(self, clause, params):
+        """Result rows as dicts for a WHERE/ORDER BY clause."""
+        with self._connection() as conn:
+            rows = conn.execute(f'SELECT {RESULT_SELECT} FROM final_results {clause}', params).fetchall()
+        return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+    def migrate_from_json(self, path):
+        """Import a legacy leaderboards.json, collapsing its repeated entries.
+
+        Each (game, player) keeps its latest score and its first finishing
+        time, as if the result had been recorded repeatedly; results already
+        in the database are left as they are. Everything, eviction included,
+        is written in one transaction that also records the import in the
+        migrations table, so the file is read once per database. Returns the
+        number of entries read.
+        """
+        migration = f'leaderboards_json:{os.path.abspath(path)}'
+        if self._migrated(migration):
+            return 0
+        try:
+            with open(path, 'r') as f:
+                leaderboards = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+
+        results = {}  # (game_code, player_name) -> row
+        count = 0
+        for game_code, entries in leaderboards.items():
+            for entry in entries:
+                key = (game_code, entry['Player'])
+                finished_at = results[key][4] if key in results else entry['Date'].removesuffix(' UTC')
+                results[key] = (*key, int(entry['Final Score']), round(entry['Final Capital'], 2), finished_at)
+                count += 1
+
+        with self._connection() as conn, conn:
+            conn.executemany(
+                'INSERT INTO final_results (game_code, player_name, final_score, final_capital, finished_at) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (game_code, player_name) DO NOTHING',
+                results.values()
+            )
+            for game_code in leaderboards:
+                self._evict(conn, game_code)
+            self._mark_migrated(conn, migration)
+        return count
@@ -0,0 +1,70 @@
+# tests/test_cointegration.py
+
+import numpy as np
+import pytest
+
+from cointegration import (EG_TAU_MAX, EG_TAU_MIN, adf_statistics, engle_granger_p_values, kalman_hedge_ratios,
+                           pair_cointegration, rolling_ols)
+
+
+@pytest.fixture
+def series():
+    """A random walk, an AR(1) with coefficient 0.5 and white noise, 40 observations each."""
+    noise = np.random.default_rng(7).standard_normal((3, 40))
+    series = np.empty_like(noise)
+    series[0] = np.cumsum(noise[0])
+    series[1, 0] = noise[1, 0]
+    for t in range(1, 40):
+        series[1, t] = 0.5 * series[1, t - 1] + noise[1, t]
+    series[2] = noise[2]
+    return series
+
+
+def test_adf_statistics_match_reference_values(series):
+    # statsmodels adfuller(row, maxlag=lags, regression='n', autolag=None)[0]
+    np.testing.assert_allclose(adf_statistics(series), [2.153419419, -4.539403157, -6.2325628], rtol=1e-8)
+    np.testing.assert_allclose(adf_statistics(series, lags=1), [1.616959013, -4.044541688, -3.960633089],
+                               rtol=1e-8)
+
+
+def test_engle_granger_p_values_match_reference_values():
+    # statsmodels mackinnonp(t, regression='c', N=2)
+    t_stats = [-5.0, -3.5, -2.62, -2.0, -1.0, 0.5]
+    expected = [0.0001646426267, 0.03239538836, 0.2296596033, 0.5285780802, 0.902847226, 0.9926499199]
+    np.testing.assert_allclose(engle_granger_p_values(t_stats), expected, rtol=1e-8)
+
+    p_values = engle_granger_p_values([EG_TAU_MAX + 1, EG_TAU_MIN - 1, np.nan])
+    assert p_values[0] == 1.0 and p_values[1] == 0.0 and np.isnan(p_values[2])
+
+
+def test_rolling_ols_matches_polyfit_per_window(series):
+    y, x, window = series[:2], series[1:], 7
+    alpha, beta = rolling_ols(y, x, window)
+
+    assert alpha.shape == beta.shape == (2, series.shape[1] - window + 1)
+    for row in range(2):
+        for end in range(window, series.shape[1] + 1):
+            slope, intercept = np.polyfit(x[row, end - window:end], y[row, end - window:end], 1)
+            assert beta[row, end - window] == pytest.approx(slope, rel=1e-8, abs=1e-10)
+            assert alpha[row, end - window] == pytest.approx(intercept, rel=1e-8, abs=1e-10)
+
+
+def test_kalman_hedge_ratios_track_a_fixed_relationship(series):
+    x = 50 + series[0]
+    alpha, beta = kalman_hedge_ratios(2 * x + 1, x, delta=1e-2, observation_var=1e-3)
+
+    assert alpha.shape == beta.shape == (1, series.shape[1])
+    assert beta[0, -1] == pytest.approx(2, abs=0.05)
+    assert 2 * x[-1] + 1 - (alpha[0, -1] + beta[0, -1] * x[-1]) == pytest.approx(0, abs=0.1)
+
+
+def test_pair_cointegration_adds_latest_time_varying_hedge_ratios(series):
+    prices = 100 + series
+    result = pair_cointegration(prices, window=10, time_varying=True)
+
+    np.testing.assert_allclose(result['rolling_hedge_ratio'],
+                               rolling_ols(prices[[0, 0, 1]], prices[[1, 2, 2]], 10)[1][:, -1])
+    np.testing.assert_allclose(result['kalman_hedge_ratio'],
+                               kalman_hedge_ratios(prices[[0, 0, 1]], prices[[1, 2, 2]])[1][:, -1])
+    assert np.isnan(pair_cointegration(prices[:, :3], time_varying=True)['kalman_hedge_ratio']).all()
+    assert 'kalman_hedge_ratio' not in pair_cointegration(prices)
@@ -0,0 +1,140 @@
+# tests/test_engine.py
+
+import threading
+import time
+
+import pytest
+
+import engine
+from engine import ACTIONS, MAX_WRITE_ATTEMPTS, GameEngine
+from storage import GameStore, VersionConflict
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'games.db')
+
+
+def two_processes(db_path):
+    """Two engines with their own stores and locks on one database, as in two server processes."""
+    first, second = GameEngine(GameStore(db_path)), GameEngine(GameStore(db_path))
+    first.create_game('GAME', seed=0)
+    first.join('GAME', 'alice')
+    second.join('GAME', 'bob')
+    return first, second
+
+
+def test_save_game_rejects_stale_version(db_path):
+    store = GameStore(db_path)
+    GameEngine(store).create_game('GAME', seed=0)
+    version, game = store.load_game_versioned('GAME')
+    store.save_game('GAME', store.load_game('GAME'))
+
+    game['current_round'] = 7
+    with pytest.raises(VersionConflict):
+        store.save_game('GAME', game, expected_version=version)
+    assert store.round_info('GAME')[0] == 1
+    assert store.version('GAME') == version + 1
+
+
+def test_conflicting_write_is_replayed_on_fresh_state(db_path, monkeypatch):
+    first, second = two_processes(db_path)
+    monkeypatch.setattr(engine.time, 'sleep', lambda seconds: None)
+
+    # The other process decides between this engine's load and its save
+    save_game = first.store.save_game
+    def save_after_other_process(*args, **kwargs):
+        if not second.store.load_game('GAME')['players']['bob']['decisions']:
+            second.decide('GAME', 'bob', (0, 1), ACTIONS[1], 3)
+        return save_game(*args, **kwargs)
+    monkeypatch.setattr(first.store, 'save_game', save_after_other_process)
+
+    decision = first.decide('GAME', 'alice', (0, 2), ACTIONS[0], 5)
+
+    game = GameStore(db_path).load_game('GAME')
+    assert decision['round'] == 2  # Replayed after bob's decision closed round 1
+    assert game['current_round'] == 3
+    assert len(game['players']['alice']['decisions']) == 1
+    assert len(game['players']['bob']['decisions']) == 1
+    assert len(game['asset_price_history']) == 3
+    assert first.lock_stats()['GAME']['conflicts'] == 1
+    assert [row['Player'] for row in first.leaderboard('GAME').records()].count('bob') == 1
+
+
+def test_gives_up_after_max_attempts(db_path, monkeypatch):
+    first, _ = two_processes(db_path)
+    waits = []
+    monkeypatch.setattr(engine.time, 'sleep', waits.append)
+
+    def always_conflicts(game_code, *args, **kwargs):
+        raise VersionConflict(f"Game '{game_code}' changed")
+    monkeypatch.setattr(first.store, 'save_game', always_conflicts)
+
+    with pytest.raises(VersionConflict):
+        first.decide('GAME', 'alice', (0, 1), ACTIONS[0], 5)
+    assert first.lock_stats()['GAME']['conflicts'] == MAX_WRITE_ATTEMPTS
+    assert len(waits) == MAX_WRITE_ATTEMPTS - 1
+    assert all(0 <= wait <= engine.MAX_WRITE_BACKOFF_SECONDS for wait in waits)
+    assert GameStore(db_path).round_info('GAME')[0] == 1
+
+
+def test_submit_rejects_decisions_that_cannot_be_settled(db_path):
+    game_engine = GameEngine(GameStore(db_path))
+    game_engine.create_game('GAME', seed=0)
+    game_engine.join('GAME', 'alice')
+
+    for pair, action, risk_level in [((1, 0), ACTIONS[0], 5), ((0, 5), ACTIONS[0], 5), ((2, 2), ACTIONS[0], 5),
+                                     ((0, 1), 'Buy', 5), ((0, 1), ACTIONS[0], 0), ((0, 1), ACTIONS[0], 11)]:
+        with pytest.raises(ValueError):
+            game_engine.submit('GAME', 'alice', pair, action, risk_level)
+    assert game_engine.pending('GAME') == {}
+
+    assert game_engine.submit('GAME', 'alice', (0, 1), ACTIONS[0], 5) == 1
+    assert game_engine.close_round('GAME')['alice']['round'] == 1
+
+
+def test_restarted_engine_closes_rounds_with_queued_decisions(db_path):
+    first, _ = two_processes(db_path)
+    assert first.submit('GAME', 'alice', (0, 1), ACTIONS[2], 1) == 1
+
+    # A new process with a round clock picks up the queued round and closes it on timeout
+    restarted = GameEngine(GameStore(db_path), round_seconds=0.2)
+    assert restarted.clock.running('GAME')
+    for _ in range(100):
+        if not restarted.clock.running('GAME'):
+            break
+        time.sleep(0.05)
+    assert restarted.store.round_info('GAME')[0] == 2
+    assert restarted.pending('GAME') == {}
+    assert not restarted.resume_clock('GAME')
+
+
+def test_concurrent_creations_store_one_game(db_path):
+    engines = [GameEngine(GameStore(db_path)) for _ in range(4)]
+    created = []
+    threads = [threading.Thread(target=lambda e=e, k=k: created.append(e.create_game('GAME', seed=k)))
+               for k, e in enumerate(engines)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(created) == [False, False, False, True]
+    assert GameStore(db_path).version('GAME') == 1
+    assert not engines[0].create_game('GAME', seed=9)
+
+
+def test_advancing_a_round_settles_its_queued_decisions(db_path):
+    first, second = two_processes(db_path)
+    assert second.submit('GAME', 'bob', (0, 1), ACTIONS[0], 5) == 1
+    first.decide('GAME', 'alice', (0, 2), ACTIONS[1], 5)
+
+    assert first.submit('GAME', 'alice', (1, 2), ACTIONS[2], 3) == 2
+    assert first.advance_round('GAME')
+
+    game = GameStore(db_path).load_game('GAME')
+    assert game['current_round'] == 3
+    assert list(game['players']['alice']['decisions']['round']) == [1, 2]
+    assert list(game['players']['bob']['decisions']['round']) == [1]
+    assert GameStore(db_path).games_with_pending_decisions() == []
+    assert [row['Player'] for row in first.leaderboard('GAME').records()].count('bob') == 1
@@ -0,0 +1,113 @@
+# tests/test_indicators.py
+
+import numpy as np
+import pytest
+
+from indicators import (MA_LONG_WINDOW, MA_SHORT_WINDOW, MACD_FAST_SPAN, MACD_SIGNAL_SPAN, MACD_SLOW_SPAN,
+                        RSI_WINDOW, GameIndicators, all_pair_statistics, asset_pairs, ewm_last, game_correlation,
+                        relative_strength, top_correlated_pairs, trailing_means)
+from price_history import PriceHistory
+
+NUM_ASSETS = 5
+
+
+@pytest.fixture
+def history():
+    """60 rounds of random-walk prices for `NUM_ASSETS` assets."""
+    rng = np.random.default_rng(3)
+    return 100 + np.cumsum(rng.normal(0, 2, (60, NUM_ASSETS)), axis=0)
+
+
+def batch_asset_snapshots(history):
+    """`GameIndicators.asset_snapshot` of every asset, recomputed with the batched functions."""
+    prices = history.T
+    macd = ewm_last(prices, MACD_FAST_SPAN) - ewm_last(prices, MACD_SLOW_SPAN)
+    signal = ewm_last(prices, MACD_SIGNAL_SPAN)
+    return {
+        'ma_short': trailing_means(prices, MA_SHORT_WINDOW),
+        'ma_long': trailing_means(prices, MA_LONG_WINDOW),
+        'rsi': relative_strength(prices),
+        'macd': macd,
+        'signal': signal,
+        'macd_hist': macd - signal
+    }
+
+
+def batch_pair_snapshots(history):
+    """`GameIndicators.pair_snapshot` of every pair, recomputed with the batched functions."""
+    pairs = asset_pairs(NUM_ASSETS)
+    spreads = np.array([history[:, i] - history[:, j] for i, j in pairs])
+    window = spreads[:, -MA_LONG_WINDOW:]
+    return {
+        'z_score': all_pair_statistics(history.T, with_cointegration=False)['z_score'],
+        'rolling_z_score': (spreads[:, -1] - window.mean(axis=1)) / window.std(axis=1),
+        'std_spread': spreads.std(axis=1)
+    }
+
+
+@pytest.mark.parametrize('rounds', [2, MA_SHORT_WINDOW, RSI_WINDOW + 1, MA_LONG_WINDOW + 3, 60])
+def test_snapshots_match_batch_recomputation(history, rounds):
+    indicators = GameIndicators(NUM_ASSETS)
+    for prices in history[:rounds]:
+        indicators.append(prices)
+
+    for key, values in batch_asset_snapshots(history[:rounds]).items():
+        snapshots = [indicators.asset_snapshot(asset)[key] for asset in range(NUM_ASSETS)]
+        np.testing.assert_allclose(snapshots, values, rtol=1e-9, atol=1e-9, err_msg=key)
+    for key, values in batch_pair_snapshots(history[:rounds]).items():
+        snapshots = [indicators.pair_snapshot(i, j)[key] for i, j in asset_pairs(NUM_ASSETS)]
+        np.testing.assert_allclose(snapshots, values, rtol=1e-9, atol=1e-9, err_msg=key)
+
+
+def test_state_survives_a_bytes_round_trip(history):
+    indicators = GameIndicators(NUM_ASSETS)
+    for prices in history[:30]:
+        indicators.append(prices)
+
+    restored = GameIndicators.from_bytes(NUM_ASSETS, indicators.to_bytes())
+    for name in ('count', 'recent', 'ema', 'spread_mean', 'spread_m2'):
+        np.testing.assert_array_equal(getattr(restored, name), getattr(indicators, name))
+
+    # The restored state keeps updating exactly like the original
+    for prices in history[30:]:
+        indicators.append(prices)
+        restored.append(prices)
+    assert restored.to_bytes() == indicators.to_bytes()
+    assert restored.pair_snapshot(1, 3) == indicators.pair_snapshot(1, 3)
+
+
+def window_correlation(rows, window):
+    """np.corrcoef of the last `window` rows (all of them for None); NaN for fewer than two rows."""
+    rows = rows if window is None else rows[max(len(rows) - window, 0):]
+    return np.full((NUM_ASSETS, NUM_ASSETS), np.nan) if len(rows) < 2 else np.corrcoef(rows.T)
+
+
+@pytest.mark.parametrize('window', [None, 1, 7, 25])
+def test_game_correlation_tracks_corrcoef_as_the_history_grows(history, window):
+    assets = [f'Asset {k}' for k in range(NUM_ASSETS)]
+    game = {'asset_price_history': PriceHistory(assets)}
+    game_code = f'CORR-{window}'
+    for rounds, prices in enumerate(history, start=1):
+        game['asset_price_history'].append(prices)
+        correlation = game_correlation(game_code, game, window)
+        np.testing.assert_allclose(correlation, window_correlation(history[:rounds], window), atol=1e-9)
+        assert game_correlation(game_code, game, window) is correlation
+        assert not correlation.flags.writeable
+        if rounds % 4 == 0:
+            # Several rounds consumed, and several rows leaving the window, in one call
+            np.testing.assert_allclose(game_correlation(f'{game_code}-sparse', game, window),
+                                       window_correlation(history[:rounds], window), atol=1e-9)
+
+
+def test_top_correlated_pairs_ranks_by_absolute_correlation():
+    correlation = np.array([
+        [1.0, 0.2, -0.9, 0.5],
+        [0.2, 1.0, np.nan, 0.7],
+        [-0.9, np.nan, 1.0, -0.1],
+        [0.5, 0.7, -0.1, 1.0]
+    ])
+    assert top_correlated_pairs(correlation, k=3) == [(0, 2, -0.9), (1, 3, 0.7), (0, 3, 0.5)]
+    assert [pair[:2] for pair in top_correlated_pairs(correlation, k=10)] == [
+        (0, 2), (1, 3), (0, 3), (0, 1), (2, 3), (1, 2)
+    ]
+    assert top_correlated_pairs(np.ones((1, 1))) == []
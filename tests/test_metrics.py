@@ -0,0 +1,28 @@
+# tests/test_metrics.py
+
+import pstats
+import threading
+
+from metrics import RerunProfiler
+
+
+def test_rerun_profiler_discards_runs_that_never_stopped(tmp_path):
+    path = str(tmp_path / 'rerun.prof')
+    profiler = RerunProfiler('cprofile', path)
+
+    # A run cut short by st.stop: its thread ends without calling stop
+    started = []
+    run = threading.Thread(target=lambda: started.append(profiler.start()))
+    run.start()
+    run.join()
+    assert started == [True]
+
+    # A run cut short by st.rerun, followed by the rerun in the same thread
+    assert profiler.start()
+    assert profiler.start()
+    sum(range(1000))
+    profiler.stop()
+
+    assert profiler.done
+    assert not profiler.start()
+    assert pstats.Stats(path).total_calls > 0
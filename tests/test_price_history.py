@@ -0,0 +1,93 @@
+# tests/test_price_history.py
+
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from engine import new_game
+from price_history import INITIAL_CAPACITY, PriceHistoryFile
+from storage import GameStore
+
+NUM_ASSETS = 3
+
+# Tables of a database created before the price files, with prices kept one JSON row per round
+LEGACY_SCHEMA = """
+CREATE TABLE games (
+    game_code TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE players (
+    game_code TEXT NOT NULL,
+    player_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    decisions BLOB,
+    PRIMARY KEY (game_code, player_name)
+);
+CREATE TABLE price_history (
+    game_code TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    prices TEXT NOT NULL,
+    PRIMARY KEY (game_code, round)
+);
+"""
+
+
+def test_file_grows_past_its_initial_capacity(tmp_path):
+    path = str(tmp_path / 'GAME.f64')
+    rows = np.arange(5 * INITIAL_CAPACITY * NUM_ASSETS, dtype=np.float64).reshape(-1, NUM_ASSETS)
+    history_file = PriceHistoryFile(path, NUM_ASSETS)
+    reader = PriceHistoryFile(path, NUM_ASSETS)  # Another process mapping the same file
+    assert history_file.capacity == INITIAL_CAPACITY
+
+    for start in range(INITIAL_CAPACITY):
+        history_file.write(start, rows[start])
+    early_view = history_file.view(INITIAL_CAPACITY)
+    history_file.write(INITIAL_CAPACITY, rows[INITIAL_CAPACITY])
+    assert history_file.capacity == 2 * INITIAL_CAPACITY
+
+    # A block past twice the capacity grows the file to fit it at once
+    history_file.write(INITIAL_CAPACITY + 1, rows[INITIAL_CAPACITY + 1:])
+    assert history_file.capacity == len(rows)
+    assert os.path.getsize(path) == len(rows) * NUM_ASSETS * 8
+
+    np.testing.assert_array_equal(early_view, rows[:INITIAL_CAPACITY])
+    np.testing.assert_array_equal(history_file.view(len(rows)), rows)
+    np.testing.assert_array_equal(reader.view(len(rows)), rows)
+    assert not reader.view(len(rows)).flags.writeable
+
+
+def test_legacy_price_table_moves_into_price_files(tmp_path):
+    db_path = str(tmp_path / 'games.db')
+    assets = [f'Asset {k}' for k in range(NUM_ASSETS)]
+    rng = np.random.default_rng(0)
+    histories = {'LONG': rng.uniform(50, 150, (INITIAL_CAPACITY + 10, NUM_ASSETS)).round(2),
+                 'SHORT': rng.uniform(50, 150, (2, NUM_ASSETS)).round(2)}
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_SCHEMA)
+    for game_code, history in histories.items():
+        game = new_game(seed=0, num_rounds=len(history) + 5, assets=assets, initial_prices=history[-1])
+        state = {key: value for key, value in game.items() if key not in ('players', 'asset_price_history')}
+        state['current_round'] = len(history) + 1
+        conn.execute('INSERT INTO games (game_code, state, version) VALUES (?, ?, 3)', (game_code, json.dumps(state)))
+        conn.executemany('INSERT INTO price_history (game_code, round, prices) VALUES (?, ?, ?)',
+                         [(game_code, k, json.dumps(row.tolist())) for k, row in enumerate(history)])
+    conn.commit()
+    conn.close()
+
+    store = GameStore(db_path)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'price_history'").fetchone() is None
+        history_rows = dict(conn.execute('SELECT game_code, history_rows FROM games'))
+    assert history_rows == {'LONG': INITIAL_CAPACITY + 10, 'SHORT': 2}
+    for game_code, history in histories.items():
+        np.testing.assert_array_equal(store.load_game(game_code)['asset_price_history'].values, history)
+
+    # Later rounds are appended after the migrated rows, and reopening the store does not migrate again
+    game = store.load_game('LONG')
+    store.save_game('LONG', game, prices=[1.0, 2.0, 3.0])
+    reopened = GameStore(db_path).load_game('LONG')['asset_price_history'].values
+    np.testing.assert_array_equal(reopened, np.vstack([histories['LONG'], [[1.0, 2.0, 3.0]]]))
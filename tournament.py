@@ -0,0 +1,166 @@
+# tournament.py
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+import numpy as np
+
+from engine import (NUM_ROUNDS, hold_strategy, macd_filter_strategy, random_strategy,
+                    rsi_filter_strategy, simulate_games, threshold_strategy)
+
+# ============================
+# ====== CONFIGURATION =======
+# ============================
+
+# Strategy factories by name; tournaments refer to strategies by name and
+# keyword arguments so that work units can be sent to worker processes
+STRATEGY_FACTORIES = {
+    'threshold': threshold_strategy,
+    'rsi_filter': rsi_filter_strategy,
+    'macd_filter': macd_filter_strategy,
+    'random': random_strategy,
+    'hold': hold_strategy
+}
+
+# Default line-up: (label, factory name, keyword arguments)
+DEFAULT_STRATEGIES = [
+    ('threshold_1.0', 'threshold', {'threshold': 1.0}),
+    ('threshold_1.5', 'threshold', {'threshold': 1.5}),
+    ('rsi_filter', 'rsi_filter', {}),
+    ('macd_filter', 'macd_filter', {}),
+    ('random', 'random', {}),
+    ('hold', 'hold', {})
+]
+
+RESULT_COLUMNS = ('capital', 'score', 'penalties', 'successes', 'trades')
+
+# ============================
+# ====== WORKERS =============
+# ============================
+
+def run_chunk(task):
+    """Play one chunk of games for one strategy; runs in a worker process.
+
+    `task` is `(chunk index, strategy index, factory name, kwargs, games,
+    rounds, SeedSequence)`. Every strategy gets the same SeedSequence for a
+    chunk, so all strategies are scored on identical markets.
+    """
+    chunk, strategy_index, factory, kwargs, num_games, num_rounds, seed_sequence = task
+    start = time.perf_counter()
+    totals = simulate_games(
+        num_games, {'player': STRATEGY_FACTORIES[factory](**kwargs)},
+        num_rounds=num_rounds, seed=np.random.default_rng(seed_sequence)
+    )['player']
+    return chunk, strategy_index, totals, time.perf_counter() - start
+
+# ============================
+# ====== TOURNAMENT ==========
+# ============================
+
+def run_tournament(num_games, strategies=DEFAULT_STRATEGIES, num_rounds=NUM_ROUNDS, seed=0,
+                   chunk_size=2000, workers=None):
+    """Play `num_games` seeded games per strategy across a process pool.
+
+    Games are split into chunks of `chunk_size`, and each chunk gets its own
+    child of `SeedSequence(seed)`, so results do not depend on the number of
+    workers and no RNG state is shared between processes. Returns
+    `(results, throughput)`: `results` is a dict of columns with one row per
+    game and strategy (`strategy` holds the index into `strategies`), and
+    `throughput` maps strategy labels to decisions per worker-second.
+    """
+    chunk_sizes = [min(chunk_size, num_games - start) for start in range(0, num_games, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    tasks = [
+        (chunk, strategy_index, factory, kwargs, size, num_rounds, seed_sequences[chunk])
+        for chunk, size in enumerate(chunk_sizes)
+        for strategy_index, (_, factory, kwargs) in enumerate(strategies)
+    ]
+
+    parts = {}
+    busy_seconds = np.zeros(len(strategies))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk, strategy_index, totals, elapsed in executor.map(run_chunk, tasks):
+            parts[strategy_index, chunk] = totals
+            busy_seconds[strategy_index] += elapsed
+
+    # Assemble columns in (strategy, chunk) order so row order is deterministic
+    keys = sorted(parts)
+    offsets = np.cumsum([0] + chunk_sizes)
+    results = {
+        'strategy': np.concatenate([np.full(chunk_sizes[chunk], index, dtype=np.int16) for index, chunk in keys]),
+        'game': np.concatenate([np.arange(offsets[chunk], offsets[chunk + 1]) for _, chunk in keys])
+    }
+    for column in RESULT_COLUMNS:
+        results[column] = np.concatenate([parts[key][column] for key in keys])
+
+    throughput = {
+        label: num_games * num_rounds / busy_seconds[index] if busy_seconds[index] else float('inf')
+        for index, (label, _, _) in enumerate(strategies)
+    }
+    return results, throughput
+
+def summarize(results, strategies=DEFAULT_STRATEGIES):
+    """Per-strategy distribution summary of final capital and score."""
+    summary = {}
+    for index, (label, _, _) in enumerate(strategies):
+        rows = results['strategy'] == index
+        capital = results['capital'][rows]
+        final_score = results['score'][rows] - results['penalties'][rows]
+        trades = results['trades'][rows].sum()
+        summary[label] = {
+            'games': int(rows.sum()),
+            'capital_mean': float(capital.mean()),
+            'capital_std': float(capital.std()),
+            'capital_p5': float(np.percentile(capital, 5)),
+            'capital_p95': float(np.percentile(capital, 95)),
+            'final_score_mean': float(final_score.mean()),
+            'win_rate': float(results['successes'][rows].sum() / trades) if trades else 0.0
+        }
+    return summary
+
+def save_results(results, path, strategies=DEFAULT_STRATEGIES):
+    """Save result columns as Parquet (requires pyarrow) if the path ends in .parquet, else as .npz."""
+    labels = np.array([label for label, _, _ in strategies])
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table(dict(results, strategy_label=labels[results['strategy']]))
+        pq.write_table(table, path)
+    else:
+        np.savez_compressed(path, strategy_labels=labels, **results)
+
+# ============================
+# ====== COMMAND LINE ========
+# ============================
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo strategy tournament for Statistical Arbitrage Showdown.")
+    parser.add_argument('--games', type=int, default=20000, help="Games per strategy")
+    parser.add_argument('--rounds', type=int, default=NUM_ROUNDS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help="Write result columns to a .npz or .parquet file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results, throughput = run_tournament(args.games, num_rounds=args.rounds, seed=args.seed,
+                                         chunk_size=args.chunk_size, workers=args.workers)
+    wall_seconds = time.perf_counter() - start
+
+    print(f"{'Strategy':<15}{'Capital':>12}{'Std':>10}{'P5':>10}{'P95':>10}{'Score':>10}{'Win %':>8}{'Dec/s':>12}")
+    for label, row in summarize(results).items():
+        print(f"{label:<15}{row['capital_mean']:>12.0f}{row['capital_std']:>10.0f}{row['capital_p5']:>10.0f}"
+              f"{row['capital_p95']:>10.0f}{row['final_score_mean']:>10.0f}{100 * row['win_rate']:>8.1f}"
+              f"{throughput[label]:>12.0f}")
+    total_decisions = args.games * args.rounds * len(DEFAULT_STRATEGIES)
+    print(f"{total_decisions} decisions in {wall_seconds:.2f}s on {args.workers} workers "
+          f"({total_decisions / wall_seconds * 60 / 1e6:.1f}M decisions/min)")
+
+    if args.output:
+        save_results(results, args.output)
+
+if __name__ == '__main__':
+    main()